@@ -1,8 +1,13 @@
 import pandas as pd
 import streamlit as st
-from datetime import datetime, time
+from datetime import datetime
 import numpy as np
 import io
+import os
+import hashlib
+import hmac
+import re
+from functools import lru_cache
 from utils.risk_engine import RiskEngine
 from utils.report_generator import ReportGenerator
 from utils.email_handler import EmailHandler
@@ -21,12 +26,15 @@ st.set_page_config(
 @st.cache_resource
 def get_components():
     admin_config = AdminConfig()
+    # The dashboard only reads from the engine and detector, so it shares the same instances
+    risk_engine = RiskEngine()
+    anomaly_detector = AnomalyDetector()
     return {
-        'risk_engine': RiskEngine(),
+        'risk_engine': risk_engine,
         'report_generator': ReportGenerator(),
         'email_handler': EmailHandler(),
-        'anomaly_detector': AnomalyDetector(),
-        'dashboard': Dashboard(RiskEngine(), AnomalyDetector()),
+        'anomaly_detector': anomaly_detector,
+        'dashboard': Dashboard(risk_engine, anomaly_detector),
         'admin_config': admin_config
     }
 
@@ -34,8 +42,42 @@ components = get_components()
 
 # Sensitive objects and configuration
 SENSITIVE_TABLES = ['Salaries', 'Employees', 'HR_Records', 'CustomerData', 'AuditLog', 'Payroll', 'SSN', 'Credit', 'Credit_Cards', 'CreditCards', 'Payment', 'Financial']
+ANOMALY_PREFIX = '_anom_'
+# Set ADMIN_HASH to the blake2b hex digest of the admin password; defaults to the demo password
+ADMIN_HASH = os.environ.get('ADMIN_HASH', hashlib.blake2b(b'admin123').hexdigest())
+UNAUTH_RE = re.compile(r'unauthorized', re.IGNORECASE)
+# Parsed uploads cached on disk; raw audit data, so only the most recent few are kept, and not for long
+CACHE_DIR = '.cache'
+CACHE_MAX_FILES = 8
+CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+# Objects counted as sensitive in the database profiles, matched as case-insensitive substrings
+SENSITIVE_OBJECT_RE = re.compile('salaries|employees|hr_records|customerdata|auditlog|credit|payment', re.IGNORECASE)
+# Low-cardinality text columns stored as categories: string ops, comparisons and nunique work on the codes
+CATEGORICAL_COLUMNS = ['OS_User', 'Exec_User', 'DB_Name', 'Program', 'Accessed_Obj']
 REQUIRED_COLUMNS = ['_time', 'OS_User', 'Exec_User', 'DB_Type', 'DB_Name', 'Program', 'Module', 'Src_Host', 'Src_IP', 'Accessed_Obj', 'Accessed_Obj_Owner', 'Statement', 'MS_Context']
 
+def add_derived_columns(df):
+    """Precompute columns that several pages derive from the raw log"""
+    # Explain each distinct statement once; missing statements take the trailing "unknown" entry
+    codes, statements = pd.factorize(df['Statement'])
+    explain_sql = components['risk_engine'].explain_sql
+    explanations = np.array([explain_sql(s) for s in statements] + [explain_sql(None)], dtype=object)
+    df['Explanation'] = explanations[codes]
+    # Hour of day shared by the dashboard charts; unparseable timestamps get -1
+    df['_hour'] = df['_time'].dt.hour.fillna(-1).astype(np.int8)
+    categorical = df.columns.intersection(CATEGORICAL_COLUMNS)
+    df[categorical] = df[categorical].astype('category')
+    return df
+
+def anomaly_records(df):
+    """Rebuild per-event anomaly dicts from the attached anomaly columns"""
+    columns = [col for col in df.columns if col.startswith(ANOMALY_PREFIX)]
+    return df[columns].rename(columns=lambda col: col[len(ANOMALY_PREFIX):]).to_dict('records')
+
+def derived_columns(df):
+    """Columns added by the app on top of the raw audit log"""
+    return [col for col in df.columns if col in ('Explanation', '_hour', '_risk') or col.startswith(ANOMALY_PREFIX)]
+
 # Load test dataset
 @st.cache_data
 def load_test_data():
@@ -52,11 +94,71 @@ def load_test_data():
                 st.warning(f"Found {invalid_dates} rows with invalid datetime formats in test data. Using current time as fallback.")
                 df['_time'] = df['_time'].fillna(pd.Timestamp.now())
         
-        return df
+        return add_derived_columns(df)
     except Exception as e:
         st.error(f"Error loading test dataset: {str(e)}")
         return None
 
+def prune_cache():
+    """Delete cached uploads past the age limit or beyond the newest CACHE_MAX_FILES"""
+    try:
+        entries = sorted(
+            (entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.parquet')),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+    except OSError:
+        return
+    cutoff = datetime.now().timestamp() - CACHE_MAX_AGE_SECONDS
+    for i, entry in enumerate(entries):
+        if i >= CACHE_MAX_FILES or entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def load_csv(upload):
+    """Load an uploaded CSV, reusing a parquet copy of the parsed log from the disk cache when available"""
+    raw = upload.getvalue()
+    key = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{key}.parquet")
+
+    # Warm hit: parquet keeps datetime64 so no re-parsing is needed
+    df = None
+    if os.path.exists(cache_path):
+        try:
+            df = pd.read_parquet(cache_path)
+            os.utime(cache_path)  # recently used uploads survive pruning
+        except Exception:
+            pass
+
+    if df is None:
+        df = pd.read_csv(io.BytesIO(raw), encoding='utf-8', on_bad_lines='skip')
+
+        # Only uploads that pass validation are cached
+        missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        if missing_cols:
+            st.error(f"Missing required columns: {', '.join(missing_cols)}")
+            return None
+
+        # Unparseable timestamps are cached as NaT; the fallback time is filled on every load
+        df['_time'] = pd.to_datetime(df['_time'], errors='coerce', format='mixed')
+
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df.to_parquet(cache_path, compression='zstd')
+            prune_cache()
+        except Exception:
+            # Caching is best-effort; mixed-type columns can't always be written to parquet
+            pass
+
+    invalid_dates = df['_time'].isna().sum()
+    if invalid_dates > 0:
+        st.warning(f"Found {invalid_dates} rows with invalid datetime formats. Using current time as fallback.")
+        df['_time'] = df['_time'].fillna(pd.Timestamp.now())
+
+    return add_derived_columns(df)
+
 def get_risk_color(score):
     if score >= 70:
         return "🔴"
@@ -65,10 +167,11 @@ def get_risk_color(score):
     else:
         return "🟢"
 
+@st.cache_data(show_spinner=False)
 def generate_risk_narrative(row, risk_score, anomalies):
     """Generate plain English narrative for SQL activity"""
     
-    explanation = components['risk_engine'].explain_sql(row['Statement'])
+    explanation = row['Explanation']
     timestamp = row['_time'].strftime('%Y-%m-%d %H:%M:%S')
     user = row['OS_User']
     database = row['DB_Name']
@@ -77,7 +180,7 @@ def generate_risk_narrative(row, risk_score, anomalies):
     # Risk indicators
     risk_color = get_risk_color(risk_score)
     sensitive = "⚠️ **Sensitive table access**" if pd.notna(row['Accessed_Obj']) and any(s.lower() in str(row['Accessed_Obj']).lower() for s in SENSITIVE_TABLES) else ""
-    unauthorized = "🚨 **Unauthorized change**" if pd.notna(context) and "unauthorized" in str(context).lower() else ""
+    unauthorized = "🚨 **Unauthorized change**" if pd.notna(context) and UNAUTH_RE.search(str(context)) else ""
     outlier = "🔍 **Outlier activity**" if anomalies.get('is_outlier', False) else ""
     off_hours = "⏰ **Off-hours access**" if anomalies.get('off_hours', False) else ""
     
@@ -95,6 +198,13 @@ def generate_risk_narrative(row, risk_score, anomalies):
     
     return narrative.strip()
 
+@lru_cache(maxsize=8)
+def split_operations(operations):
+    """Split the SQL operations into the two admin slider columns of (op, label, key) triples"""
+    sliders = tuple((op, "%s Risk Score" % op, "sql_%s" % op) for op in operations)
+    mid_point = len(sliders) // 2
+    return sliders[:mid_point], sliders[mid_point:]
+
 def main():
     # Professional navigation sidebar
     with st.sidebar:
@@ -164,7 +274,7 @@ def main():
     if uploaded_file is not None:
         # Load uploaded data
         with st.spinner("Loading and analyzing uploaded data..."):
-            df = pd.read_csv(uploaded_file, encoding='utf-8', on_bad_lines='skip')
+            df = load_csv(uploaded_file)
             data_source = uploaded_file.name
     elif st.session_state.get('use_test_data', False):
         # Load test data
@@ -197,13 +307,11 @@ def main():
             risk_threshold = st.slider("Minimum Risk Score", 0, 100, 0, help="Show only events above this risk score")
             
             # Apply filters
-            filtered_df = df[
-                (df['_time'].dt.date >= start_date) & 
-                (df['_time'].dt.date <= end_date)
-            ].copy()
+            dates = df['_time'].dt.date
+            filter_mask = (dates >= start_date) & (dates <= end_date)
             
             if selected_user != "All":
-                filtered_df = filtered_df[filtered_df['OS_User'] == selected_user]
+                filter_mask &= df['OS_User'] == selected_user
 
         # Generate cache key for both uploaded files and test data
         if uploaded_file:
@@ -214,47 +322,28 @@ def main():
         # Calculate risk scores and detect anomalies only once per data source
         if 'risk_calculations' not in st.session_state or st.session_state.get('last_upload_key') != cache_key:
             with st.spinner("Calculating risk scores and detecting anomalies..."):
-                all_risk_scores = []
-                all_anomaly_data = []
+                # Anomaly baselines are built once and every row scored in a single pass
+                all_anomaly_data = components['anomaly_detector'].detect_anomalies_batch(df)
                 
-                # Add progress bar for large datasets
-                progress_bar = st.progress(0)
-                total_rows = len(df)
-                
-                for idx, (_, row) in enumerate(df.iterrows()):
-                    risk_score = components['risk_engine'].calculate_risk_score(row, SENSITIVE_TABLES)
-                    anomalies = components['anomaly_detector'].detect_anomalies(row, df)
-                    
-                    all_risk_scores.append(risk_score)
-                    all_anomaly_data.append(anomalies)
-                    
-                    # Update progress every 10 rows or for small datasets
-                    if idx % max(1, total_rows // 100) == 0 or idx == total_rows - 1:
-                        progress_bar.progress((idx + 1) / total_rows)
-                
-                progress_bar.empty()  # Remove progress bar when done
+                # Risk factors are computed column-wise for the whole log at once
+                all_risk_scores = components['risk_engine'].calculate_risk_scores(df, SENSITIVE_TABLES)
                 
                 # Cache the calculations
                 st.session_state.risk_calculations = {
-                    'risk_scores': all_risk_scores,
+                    'risk_scores': np.asarray(all_risk_scores, dtype=np.int16),
                     'anomaly_data': all_anomaly_data
                 }
                 st.session_state.last_upload_key = cache_key
         
-        # Get cached calculations
-        all_risk_scores = st.session_state.risk_calculations['risk_scores']
-        all_anomaly_data = st.session_state.risk_calculations['anomaly_data']
-        
-        # Filter the pre-calculated results based on current filters
-        filtered_indices = filtered_df.index.tolist()
-        filtered_risk_scores = [all_risk_scores[i] for i in filtered_indices if i < len(all_risk_scores)]
-        filtered_anomaly_data = [all_anomaly_data[i] for i in filtered_indices if i < len(all_anomaly_data)]
+        # Attach cached calculations as columns so filters and pages share one frame
+        scored_df = df.assign(_risk=st.session_state.risk_calculations['risk_scores']).join(
+            st.session_state.risk_calculations['anomaly_data'].add_prefix(ANOMALY_PREFIX)
+        )
         
-        # Apply risk threshold filter
-        risk_mask = [score >= risk_threshold for score in filtered_risk_scores]
-        final_df = filtered_df[risk_mask].copy()
-        final_risk_scores = [score for score, mask in zip(filtered_risk_scores, risk_mask) if mask]
-        final_anomaly_data = [anomaly for anomaly, mask in zip(filtered_anomaly_data, risk_mask) if mask]
+        # Apply date/user filters and risk threshold in a single pass
+        final_df = scored_df.loc[filter_mask & (scored_df['_risk'] >= risk_threshold)]
+        final_risk_scores = final_df['_risk'].to_numpy()
+        final_anomaly_data = anomaly_records(final_df)
         
         if final_df.empty:
             st.warning(f"No events found above risk threshold of {risk_threshold}")
@@ -277,19 +366,14 @@ def main():
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown("#### Risk Score Distribution")
-                risk_distribution = {
-                    'High (70-100)': sum(1 for score in final_risk_scores if score >= 70),
-                    'Medium (40-69)': sum(1 for score in final_risk_scores if 40 <= score < 70),
-                    'Low (0-39)': sum(1 for score in final_risk_scores if score < 40)
-                }
+                low, medium, high = np.bincount(np.digitize(final_risk_scores, [40, 70]), minlength=3).tolist()
+                risk_distribution = {'High (70-100)': high, 'Medium (40-69)': medium, 'Low (0-39)': low}
                 st.bar_chart(risk_distribution)
             
             with col2:
                 st.subheader("👥 Users by Avg Risk")
                 # Top users by average risk
-                user_risks = final_df.copy()
-                user_risks['Risk_Score'] = final_risk_scores
-                user_avg_risk = user_risks.groupby('OS_User')['Risk_Score'].mean().sort_values(ascending=False)
+                user_avg_risk = final_df.groupby('OS_User', observed=True)['_risk'].mean().sort_values(ascending=False)
                 for user, avg_risk in user_avg_risk.head(5).items():
                     st.write(f"**{user}:** {avg_risk:.1f}")
         
@@ -329,18 +413,11 @@ def main():
                 user_indices = user_data.index.tolist()
                 
                 # Get risk scores and anomalies for this user's data
-                user_risk_scores = []
-                user_anomalies = []
-                
-                for idx in range(len(final_df)):
-                    if final_df.iloc[idx]['OS_User'] == user:
-                        if idx < len(final_risk_scores):
-                            user_risk_scores.append(final_risk_scores[idx])
-                        if idx < len(final_anomaly_data):
-                            user_anomalies.append(final_anomaly_data[idx])
+                user_risk_scores = user_data['_risk'].tolist()
+                user_anomalies = anomaly_records(user_data)
                 
                 if user_risk_scores:
-                    avg_risk = sum(user_risk_scores) / len(user_risk_scores)
+                    avg_risk = np.mean(user_risk_scores)
                     max_risk = max(user_risk_scores)
                     total_activities = len(user_data)
                     
@@ -490,18 +567,11 @@ def main():
                 db_data = final_df[final_df['DB_Name'] == database]
                 
                 # Get risk scores and anomalies for this database's data
-                db_risk_scores = []
-                db_anomalies = []
-                
-                for idx in range(len(final_df)):
-                    if final_df.iloc[idx]['DB_Name'] == database:
-                        if idx < len(final_risk_scores):
-                            db_risk_scores.append(final_risk_scores[idx])
-                        if idx < len(final_anomaly_data):
-                            db_anomalies.append(final_anomaly_data[idx])
+                db_risk_scores = db_data['_risk'].tolist()
+                db_anomalies = anomaly_records(db_data)
                 
                 if db_risk_scores:
-                    avg_risk = sum(db_risk_scores) / len(db_risk_scores)
+                    avg_risk = np.mean(db_risk_scores)
                     max_risk = max(db_risk_scores)
                     total_activities = len(db_data)
                     unique_users = db_data['OS_User'].nunique()
@@ -525,9 +595,7 @@ def main():
                         db_category = "General"
                     
                     # Check for sensitive data access
-                    sensitive_access = sum(1 for _, row in db_data.iterrows() 
-                                         if pd.notna(row['Accessed_Obj']) and any(table.lower() in str(row['Accessed_Obj']).lower() 
-                                               for table in ['salaries', 'employees', 'hr_records', 'customerdata', 'auditlog', 'credit', 'payment']))
+                    sensitive_access = int(db_data['Accessed_Obj'].dropna().astype(str).str.contains(SENSITIVE_OBJECT_RE).sum())
                     
                     database_profiles[database] = {
                         'category': db_category,
@@ -681,13 +749,17 @@ def main():
             # Timeline view
             st.markdown("### 📅 Activity Timeline")
             
-            for i, (_, row) in enumerate(final_df.head(20).iterrows()):
-                if i < len(final_risk_scores):
-                    risk_score = final_risk_scores[i]
-                    anomalies = final_anomaly_data[i] if i < len(final_anomaly_data) else {}
-                    narrative = generate_risk_narrative(row, risk_score, anomalies)
-                    st.markdown(narrative)
-                    st.divider()
+            # Only the visible page of narratives is built and rendered
+            page_size = 20
+            page_count = max(1, -(-len(final_df) // page_size))
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+            start = (page - 1) * page_size
+            
+            for i in range(start, min(start + page_size, len(final_df))):
+                row = final_df.iloc[i]
+                narrative = generate_risk_narrative(row, final_risk_scores[i], final_anomaly_data[i])
+                st.markdown(narrative)
+                st.divider()
         
         elif st.session_state.current_page == "Reports & Export":
             st.header("📤 Reports & Export")
@@ -716,15 +788,16 @@ def main():
             with col2:
                 if st.button("📊 Export Data as CSV"):
                     # Add risk scores to dataframe for export
-                    export_df = final_df.copy()
-                    export_df['Risk_Score'] = final_risk_scores
-                    csv_data = export_df.to_csv(index=False)
+                    export_df = final_df.drop(columns=derived_columns(final_df)).assign(Risk_Score=final_risk_scores)
+                    # Encode and gzip straight into one buffer instead of building the CSV as a str first
+                    csv_buffer = io.BytesIO()
+                    export_df.to_csv(csv_buffer, index=False, compression='gzip')
                     
                     st.download_button(
                         "Download CSV",
-                        data=csv_data,
-                        file_name=f"sql_audit_analyzed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
+                        data=csv_buffer.getvalue(),
+                        file_name=f"sql_audit_analyzed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz",
+                        mime="application/gzip"
                     )
         
         elif st.session_state.current_page == "Admin Configuration":
@@ -739,12 +812,15 @@ def main():
                 st.info("Admin configuration is available without uploading data.")
                 admin_password = st.text_input("Enter admin password:", type="password")
                 if st.button("Authenticate"):
-                    if admin_password == "admin123":  # Simple password - change in production
+                    password_hash = hashlib.blake2b(admin_password.encode('utf-8')).hexdigest()
+                    if hmac.compare_digest(password_hash, ADMIN_HASH):
                         st.session_state.admin_authenticated = True
                         st.success("✅ Authentication successful")
                         st.rerun()
                     else:
                         st.error("❌ Invalid password")
+                # Nothing else renders for an unauthenticated visitor
+                st.stop()
             else:
                 admin_config = components['admin_config']
                 config = admin_config.get_config()
@@ -781,95 +857,103 @@ def main():
                 with col4:
                     st.metric("Risk Components", len(config['risk_weights']))
                 
-                # Configuration tabs
-                tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+                # Configuration sections - only the selected one is built on each rerun
+                admin_section = st.radio("Section", [
                     "🎯 Risk Weights", "📊 SQL Operations", "⏰ Time Settings", 
                     "🔐 Sensitive Objects", "🏷️ Keywords", "📤 Import/Export"
-                ])
+                ], horizontal=True, key='active_admin_tab', label_visibility="collapsed")
                 
-                with tab1:
+                if admin_section == "🎯 Risk Weights":
                     st.subheader("Risk Component Weights")
                     st.markdown("**Adjust how different risk factors contribute to the overall risk score:**")
                     
                     risk_weights = config['risk_weights']
                     new_risk_weights = {}
                     
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        new_risk_weights['sql_operation'] = st.slider("SQL Operation Impact", 0.0, 1.0, risk_weights['sql_operation'], 0.05)
-                        new_risk_weights['timing'] = st.slider("Time-based Risk", 0.0, 1.0, risk_weights['timing'], 0.05)
-                        new_risk_weights['context'] = st.slider("Context Keywords", 0.0, 1.0, risk_weights['context'], 0.05)
+                    # Sliders only post back on submit instead of rerunning per change
+                    with st.form("risk_weights_form"):
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            new_risk_weights['sql_operation'] = st.slider("SQL Operation Impact", 0.0, 1.0, risk_weights['sql_operation'], 0.05)
+                            new_risk_weights['timing'] = st.slider("Time-based Risk", 0.0, 1.0, risk_weights['timing'], 0.05)
+                            new_risk_weights['context'] = st.slider("Context Keywords", 0.0, 1.0, risk_weights['context'], 0.05)
                     
-                    with col2:
-                        new_risk_weights['sensitive_objects'] = st.slider("Sensitive Object Access", 0.0, 1.0, risk_weights['sensitive_objects'], 0.05)
-                        new_risk_weights['user_factors'] = st.slider("User Factors", 0.0, 1.0, risk_weights['user_factors'], 0.05)
-                        new_risk_weights['program'] = st.slider("Program Risk", 0.0, 1.0, risk_weights['program'], 0.05)
+                        with col2:
+                            new_risk_weights['sensitive_objects'] = st.slider("Sensitive Object Access", 0.0, 1.0, risk_weights['sensitive_objects'], 0.05)
+                            new_risk_weights['user_factors'] = st.slider("User Factors", 0.0, 1.0, risk_weights['user_factors'], 0.05)
+                            new_risk_weights['program'] = st.slider("Program Risk", 0.0, 1.0, risk_weights['program'], 0.05)
+                        
+                        update_risk_weights = st.form_submit_button("Update Risk Weights")
                     
                     # Show total weight
-                    total_weight = sum(new_risk_weights.values())
+                    total_weight = float(np.fromiter(new_risk_weights.values(), dtype=np.float64, count=len(new_risk_weights)).sum())
                     if abs(total_weight - 1.0) > 0.01:
                         st.warning(f"⚠️ Weights sum to {total_weight:.2f} - should equal 1.0 for optimal scoring")
                     else:
                         st.success(f"✅ Weights sum to {total_weight:.2f}")
                     
-                    if st.button("Update Risk Weights"):
+                    if update_risk_weights:
                         config['risk_weights'] = new_risk_weights
                         admin_config.config = config
                         if admin_config.save_config():
                             st.success("✅ Risk weights updated successfully!")
-                            st.cache_resource.clear()
                             st.rerun()
                 
-                with tab2:
+                elif admin_section == "📊 SQL Operations":
                     st.subheader("SQL Operation Risk Scores")
                     st.markdown("**Configure risk points for different SQL operations:**")
                     
                     sql_weights = config['sql_operation_weights']
                     new_sql_weights = {}
                     
-                    col1, col2 = st.columns(2)
-                    operations = list(sql_weights.keys())
-                    mid_point = len(operations) // 2
+                    with st.form("sql_weights_form"):
+                        col1, col2 = st.columns(2)
+                        left_operations, right_operations = split_operations(tuple(sql_weights))
                     
-                    with col1:
-                        for op in operations[:mid_point]:
-                            new_sql_weights[op] = st.slider(f"{op} Risk Score", 0, 50, sql_weights[op], key=f"sql_{op}")
+                        with col1:
+                            for op, label, key in left_operations:
+                                new_sql_weights[op] = st.slider(label, 0, 50, sql_weights[op], key=key)
                     
-                    with col2:
-                        for op in operations[mid_point:]:
-                            new_sql_weights[op] = st.slider(f"{op} Risk Score", 0, 50, sql_weights[op], key=f"sql_{op}")
+                        with col2:
+                            for op, label, key in right_operations:
+                                new_sql_weights[op] = st.slider(label, 0, 50, sql_weights[op], key=key)
+                        
+                        update_sql_weights = st.form_submit_button("Update SQL Operation Scores")
                     
-                    if st.button("Update SQL Operation Scores"):
+                    if update_sql_weights:
                         config['sql_operation_weights'] = new_sql_weights
                         admin_config.config = config
                         if admin_config.save_config():
                             st.success("✅ SQL operation scores updated successfully!")
-                            st.cache_resource.clear()
                             st.rerun()
                 
-                with tab3:
+                elif admin_section == "⏰ Time Settings":
                     st.subheader("Time-Based Risk Settings")
                     
                     time_settings = config['time_settings']
+                    off_hours_times = admin_config.get_off_hours_times()
                     
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown("**Off-Hours Definition:**")
-                        off_start = st.time_input("Off-hours start", time.fromisoformat(time_settings['off_hours_start']))
-                        off_end = st.time_input("Off-hours end", time.fromisoformat(time_settings['off_hours_end']))
+                    with st.form("time_settings_form"):
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown("**Off-Hours Definition:**")
+                            off_start = st.time_input("Off-hours start", off_hours_times['off_hours_start'])
+                            off_end = st.time_input("Off-hours end", off_hours_times['off_hours_end'])
                         
-                        st.markdown("**Bonus Points:**")
-                        off_hours_bonus = st.slider("Off-hours bonus", 0, 30, time_settings['off_hours_bonus'])
-                        weekend_bonus = st.slider("Weekend bonus", 0, 30, time_settings['weekend_bonus'])
+                            st.markdown("**Bonus Points:**")
+                            off_hours_bonus = st.slider("Off-hours bonus", 0, 30, time_settings['off_hours_bonus'])
+                            weekend_bonus = st.slider("Weekend bonus", 0, 30, time_settings['weekend_bonus'])
                     
-                    with col2:
-                        st.markdown("**Multipliers:**")
-                        weekend_mult = st.slider("Weekend multiplier", 1.0, 3.0, time_settings['weekend_multiplier'], 0.1)
+                        with col2:
+                            st.markdown("**Multipliers:**")
+                            weekend_mult = st.slider("Weekend multiplier", 1.0, 3.0, time_settings['weekend_multiplier'], 0.1)
+                        
+                            st.markdown("**Special Time Periods:**")
+                            late_night_bonus = st.slider("Late night bonus (12-5 AM)", 0, 20, time_settings['late_night_bonus'])
                         
-                        st.markdown("**Special Time Periods:**")
-                        late_night_bonus = st.slider("Late night bonus (12-5 AM)", 0, 20, time_settings['late_night_bonus'])
+                        update_time_settings = st.form_submit_button("Update Time Settings")
                     
-                    if st.button("Update Time Settings"):
+                    if update_time_settings:
                         new_time_settings = {
                             'off_hours_start': off_start.strftime('%H:%M'),
                             'off_hours_end': off_end.strftime('%H:%M'),
@@ -882,10 +966,9 @@ def main():
                         admin_config.config = config
                         if admin_config.save_config():
                             st.success("✅ Time settings updated successfully!")
-                            st.cache_resource.clear()
                             st.rerun()
                 
-                with tab4:
+                elif admin_section == "🔐 Sensitive Objects":
                     st.subheader("Sensitive Objects & Programs")
                     
                     col1, col2 = st.columns(2)
@@ -893,49 +976,53 @@ def main():
                     with col1:
                         st.markdown("**Sensitive Tables/Objects:**")
                         
-                        sensitive_tables = config['sensitive_tables']
-                        new_sensitive = st.text_area(
-                            "Sensitive tables (one per line):",
-                            value='\n'.join(sensitive_tables),
-                            height=150
-                        )
+                        with st.form("sensitive_tables_form"):
+                            sensitive_tables = config['sensitive_tables']
+                            new_sensitive = st.text_area(
+                                "Sensitive tables (one per line):",
+                                value='\n'.join(sensitive_tables),
+                                height=150
+                            )
+                            
+                            submitted = st.form_submit_button("Update Sensitive Tables")
                         
-                        if st.button("Update Sensitive Tables"):
+                        if submitted:
                             new_tables = [table.strip() for table in new_sensitive.split('\n') if table.strip()]
                             config['sensitive_tables'] = new_tables
                             admin_config.config = config
                             if admin_config.save_config():
                                 st.success("✅ Sensitive tables updated!")
-                                st.cache_resource.clear()
                                 st.rerun()
                     
                     with col2:
                         st.markdown("**High-Risk Programs:**")
                         
-                        high_risk_programs = config['high_risk_programs']
-                        new_high_risk = st.text_area(
-                            "High-risk programs (one per line):",
-                            value='\n'.join(high_risk_programs),
-                            height=75
-                        )
+                        with st.form("program_lists_form"):
+                            high_risk_programs = config['high_risk_programs']
+                            new_high_risk = st.text_area(
+                                "High-risk programs (one per line):",
+                                value='\n'.join(high_risk_programs),
+                                height=75
+                            )
                         
-                        medium_risk_programs = config['medium_risk_programs']
-                        new_medium_risk = st.text_area(
-                            "Medium-risk programs (one per line):",
-                            value='\n'.join(medium_risk_programs),
-                            height=75
-                        )
+                            medium_risk_programs = config['medium_risk_programs']
+                            new_medium_risk = st.text_area(
+                                "Medium-risk programs (one per line):",
+                                value='\n'.join(medium_risk_programs),
+                                height=75
+                            )
+                            
+                            submitted = st.form_submit_button("Update Program Lists")
                         
-                        if st.button("Update Program Lists"):
+                        if submitted:
                             config['high_risk_programs'] = [p.strip() for p in new_high_risk.split('\n') if p.strip()]
                             config['medium_risk_programs'] = [p.strip() for p in new_medium_risk.split('\n') if p.strip()]
                             admin_config.config = config
                             if admin_config.save_config():
                                 st.success("✅ Program lists updated!")
-                                st.cache_resource.clear()
                                 st.rerun()
                 
-                with tab5:
+                elif admin_section == "🏷️ Keywords":
                     st.subheader("Context Keywords")
                     
                     col1, col2 = st.columns(2)
@@ -943,40 +1030,44 @@ def main():
                     with col1:
                         st.markdown("**High-Risk Keywords (+25 points):**")
                         
-                        high_risk_keywords = config['high_risk_keywords']
-                        new_high_keywords = st.text_area(
-                            "High-risk keywords:",
-                            value='\n'.join(high_risk_keywords),
-                            height=150
-                        )
+                        with st.form("high_risk_keywords_form"):
+                            high_risk_keywords = config['high_risk_keywords']
+                            new_high_keywords = st.text_area(
+                                "High-risk keywords:",
+                                value='\n'.join(high_risk_keywords),
+                                height=150
+                            )
+                            
+                            submitted = st.form_submit_button("Update High-Risk Keywords")
                         
-                        if st.button("Update High-Risk Keywords"):
+                        if submitted:
                             config['high_risk_keywords'] = [k.strip() for k in new_high_keywords.split('\n') if k.strip()]
                             admin_config.config = config
                             if admin_config.save_config():
                                 st.success("✅ High-risk keywords updated!")
-                                st.cache_resource.clear()
                                 st.rerun()
                     
                     with col2:
                         st.markdown("**Low-Risk Keywords (0 points):**")
                         
-                        low_risk_keywords = config['low_risk_keywords']
-                        new_low_keywords = st.text_area(
-                            "Low-risk keywords:",
-                            value='\n'.join(low_risk_keywords),
-                            height=150
-                        )
+                        with st.form("low_risk_keywords_form"):
+                            low_risk_keywords = config['low_risk_keywords']
+                            new_low_keywords = st.text_area(
+                                "Low-risk keywords:",
+                                value='\n'.join(low_risk_keywords),
+                                height=150
+                            )
+                            
+                            submitted = st.form_submit_button("Update Low-Risk Keywords")
                         
-                        if st.button("Update Low-Risk Keywords"):
+                        if submitted:
                             config['low_risk_keywords'] = [k.strip() for k in new_low_keywords.split('\n') if k.strip()]
                             admin_config.config = config
                             if admin_config.save_config():
                                 st.success("✅ Low-risk keywords updated!")
-                                st.cache_resource.clear()
                                 st.rerun()
                 
-                with tab6:
+                elif admin_section == "📤 Import/Export":
                     st.subheader("Configuration Import/Export")
                     
                     col1, col2, col3 = st.columns(3)
@@ -997,10 +1088,9 @@ def main():
                         
                         if uploaded_config and st.button("Import Config"):
                             try:
-                                config_content = uploaded_config.read().decode('utf-8')
+                                config_content = uploaded_config.getvalue()
                                 if admin_config.import_config(config_content):
                                     st.success("✅ Configuration imported successfully!")
-                                    st.cache_resource.clear()
                                     st.rerun()
                                 else:
                                     st.error("❌ Invalid configuration file")
@@ -1013,14 +1103,14 @@ def main():
                             if st.button("⚠️ Confirm Reset", type="primary"):
                                 if admin_config.reset_to_defaults():
                                     st.success("✅ Configuration reset to defaults!")
-                                    st.cache_resource.clear()
                                     st.rerun()
                                 else:
                                     st.error("❌ Reset failed")
                     
                     # Current configuration preview
                     st.markdown("**Current Configuration Preview:**")
-                    with st.expander("View current settings", expanded=False):
+                    # A collapsed expander still ships the full payload, so only build it on request
+                    if st.checkbox("View current settings", value=False):
                         st.json(config)
     
     else:
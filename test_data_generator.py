@@ -1,12 +1,10 @@
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
 
 # Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+rng = np.random.default_rng(42)
 
 # Configuration
 NUM_ROWS = 5000
@@ -16,6 +14,8 @@ PROGRAMS = ['SSMS', 'sqlcmd', 'python', 'PowerShell', 'Excel', 'Workbench', 'DBe
 MODULES = ['QueryRunner', 'DataAnalysis', 'Command', 'Management', 'ODBC', 'Script', 'Batch']
 HOSTS = ['workstation01', 'server02', 'laptop03', 'desktop04', 'mobile05']
 IPS = ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4', '10.0.0.5']
+# Low-cardinality columns held as category dtype (int codes) while the frame is built
+CATEGORICAL_COLUMNS = ['OS_User', 'DB_Name', 'Program', 'Accessed_Obj', 'DB_Type', 'Src_Host', 'Src_IP', 'Module']
 
 # Database objects by risk level
 HIGH_RISK_OBJECTS = ['Salaries', 'HR_Records', 'SSN_Data', 'Credit_Cards', 'CustomerData', 'AuditLog', 'Payroll']
@@ -83,121 +83,138 @@ LOW_RISK_CONTEXTS = [
     "Standard maintenance - CHG000999"
 ]
 
-def generate_timestamp(base_date, risk_level):
-    """Generate timestamp based on risk level"""
+# Per tier: objects, SQL templates, table names substituted with the object, contexts, programs
+RISK_TIERS = {
+    'high': (HIGH_RISK_OBJECTS, HIGH_RISK_SQL, ('Salaries', 'HR_Records'), HIGH_RISK_CONTEXTS,
+             ['sqlcmd', 'python', 'PowerShell', 'SSMS']),
+    'medium': (MEDIUM_RISK_OBJECTS, MEDIUM_RISK_SQL, ('Employees', 'Orders'), MEDIUM_RISK_CONTEXTS,
+               ['SSMS', 'Workbench', 'DBeaver', 'Excel']),
+    'low': (LOW_RISK_OBJECTS, LOW_RISK_SQL, ('Orders', 'Products'), LOW_RISK_CONTEXTS,
+            ['SSMS', 'Excel', 'Workbench'])
+}
+
+def generate_timestamps(base_date, risk_levels):
+    """Generate one timestamp per row based on its risk level"""
+    size = len(risk_levels)
+    high = risk_levels == 'high'
+    medium = risk_levels == 'medium'
+    
     # Add random days (0-30)
-    days_offset = random.randint(0, 30)
-    date = base_date + timedelta(days=days_offset)
-    
-    if risk_level == 'high':
-        # High risk: more likely to be off-hours or weekends
-        if random.random() < 0.6:  # 60% chance of off-hours
-            if random.random() < 0.3:  # 30% chance of very late night
-                hour = random.randint(0, 5)
-            else:  # Off-hours but not extreme
-                hour = random.choice([19, 20, 21, 22, 23, 6, 7])
-        else:
-            hour = random.randint(9, 17)
-        
-        # Weekend probability
-        if random.random() < 0.4:  # 40% chance of weekend
-            date = date + timedelta(days=(5 - date.weekday()) % 7)
+    dates = np.datetime64(base_date.date(), 'D') + rng.integers(0, 31, size=size)
     
-    elif risk_level == 'medium':
-        # Medium risk: some off-hours but mostly business hours
-        if random.random() < 0.3:  # 30% chance of off-hours
-            hour = random.choice([8, 18, 19])
-        else:
-            hour = random.randint(9, 17)
+    # Default: business hours
+    hours = rng.integers(9, 18, size=size)
     
-    else:  # low risk
-        # Low risk: mostly business hours
-        hour = random.randint(9, 17)
+    # High risk: 60% off-hours, of which 30% very late night
+    off_hours = high & (rng.random(size) < 0.6)
+    late_night = rng.random(size) < 0.3
+    hours = np.where(
+        off_hours,
+        np.where(late_night, rng.integers(0, 6, size=size), rng.choice([19, 20, 21, 22, 23, 6, 7], size=size)),
+        hours
+    )
     
-    minute = random.randint(0, 59)
-    second = random.randint(0, 59)
+    # High risk: 40% chance of being pushed to the following Saturday (1970-01-01 was a Thursday)
+    weekdays = (dates.view('int64') + 3) % 7
+    weekend = high & (rng.random(size) < 0.4)
+    dates = np.where(weekend, dates + (5 - weekdays) % 7, dates)
     
-    return date.replace(hour=hour, minute=minute, second=second)
+    # Medium risk: 30% chance of edge-of-day hours
+    medium_off_hours = medium & (rng.random(size) < 0.3)
+    hours = np.where(medium_off_hours, rng.choice([8, 18, 19], size=size), hours)
+    
+    minutes = rng.integers(0, 60, size=size)
+    seconds = rng.integers(0, 60, size=size)
+    
+    return (
+        dates.astype('datetime64[s]')
+        + hours * np.timedelta64(1, 'h')
+        + minutes * np.timedelta64(1, 'm')
+        + seconds * np.timedelta64(1, 's')
+    )
+
+def _choice(options, size):
+    """Pick `size` random entries from a list as an object array"""
+    return np.asarray(options, dtype=object)[rng.integers(len(options), size=size)]
 
 def generate_test_data():
     """Generate comprehensive test dataset"""
-    data = []
     base_date = datetime(2025, 1, 1, 9, 0, 0)
     
     # Define risk distribution: 20% high, 30% medium, 50% low
-    risk_distribution = ['high'] * 1000 + ['medium'] * 1500 + ['low'] * 2500
-    random.shuffle(risk_distribution)
+    risk_levels = np.array(['high'] * 1000 + ['medium'] * 1500 + ['low'] * 2500, dtype=object)
+    rng.shuffle(risk_levels)
     
-    for i in range(NUM_ROWS):
-        risk_level = risk_distribution[i]
-        
-        # Select components based on risk level
-        if risk_level == 'high':
-            accessed_obj = random.choice(HIGH_RISK_OBJECTS)
-            statement = random.choice(HIGH_RISK_SQL).replace('Salaries', accessed_obj).replace('HR_Records', accessed_obj)
-            context = random.choice(HIGH_RISK_CONTEXTS)
-            program = random.choice(['sqlcmd', 'python', 'PowerShell', 'SSMS'])
-            
-        elif risk_level == 'medium':
-            accessed_obj = random.choice(MEDIUM_RISK_OBJECTS)
-            statement = random.choice(MEDIUM_RISK_SQL).replace('Employees', accessed_obj).replace('Orders', accessed_obj)
-            context = random.choice(MEDIUM_RISK_CONTEXTS)
-            program = random.choice(['SSMS', 'Workbench', 'DBeaver', 'Excel'])
-            
-        else:  # low risk
-            accessed_obj = random.choice(LOW_RISK_OBJECTS)
-            statement = random.choice(LOW_RISK_SQL).replace('Orders', accessed_obj).replace('Products', accessed_obj)
-            context = random.choice(LOW_RISK_CONTEXTS)
-            program = random.choice(['SSMS', 'Excel', 'Workbench'])
-        
-        # Generate other fields
-        user = random.choice(USERS)
-        database = random.choice(DATABASES)
-        timestamp = generate_timestamp(base_date, risk_level)
+    accessed_obj = np.empty(NUM_ROWS, dtype=object)
+    statement = np.empty(NUM_ROWS, dtype=object)
+    context = np.empty(NUM_ROWS, dtype=object)
+    program = np.empty(NUM_ROWS, dtype=object)
+    
+    # Fill each risk tier's columns at once from its own object/SQL/context pools
+    for risk_level, (objects, statements, placeholders, contexts, programs) in RISK_TIERS.items():
+        mask = risk_levels == risk_level
+        count = int(mask.sum())
         
-        row = {
-            '_time': timestamp,
-            'OS_User': user,
-            'Exec_User': user if random.random() < 0.9 else random.choice(USERS),  # 10% chance of different exec user
-            'DB_Type': 'MSSQL',
-            'DB_Name': database,
-            'Program': program,
-            'Module': random.choice(MODULES),
-            'Src_Host': random.choice(HOSTS),
-            'Src_IP': random.choice(IPS),
-            'Accessed_Obj': accessed_obj,
-            'Accessed_Obj_Owner': 'dbo',
-            'Statement': statement,
-            'MS_Context': context
-        }
+        # Every (statement, object) substitution is built once and then indexed
+        statement_table = np.array([
+            [sql.replace(placeholders[0], obj).replace(placeholders[1], obj) for obj in objects]
+            for sql in statements
+        ], dtype=object)
+        obj_idx = rng.integers(len(objects), size=count)
+        sql_idx = rng.integers(len(statements), size=count)
         
-        data.append(row)
+        accessed_obj[mask] = np.asarray(objects, dtype=object)[obj_idx]
+        statement[mask] = statement_table[sql_idx, obj_idx]
+        context[mask] = _choice(contexts, count)
+        program[mask] = _choice(programs, count)
+    
+    # Generate other fields
+    users = _choice(USERS, NUM_ROWS)
+    exec_users = np.where(rng.random(NUM_ROWS) < 0.9, users, _choice(USERS, NUM_ROWS))  # 10% chance of different exec user
+    timestamps = generate_timestamps(base_date, risk_levels)
+    
+    # Sort by timestamp: argsort the raw array once and take every column in that order
+    order = np.argsort(timestamps, kind='stable')
     
-    # Create DataFrame and sort by timestamp
-    df = pd.DataFrame(data)
-    df = df.sort_values('_time').reset_index(drop=True)
+    df = pd.DataFrame({
+        '_time': timestamps[order],
+        'OS_User': users[order],
+        'Exec_User': exec_users[order],
+        'DB_Type': 'MSSQL',
+        'DB_Name': _choice(DATABASES, NUM_ROWS)[order],
+        'Program': program[order],
+        'Module': _choice(MODULES, NUM_ROWS)[order],
+        'Src_Host': _choice(HOSTS, NUM_ROWS)[order],
+        'Src_IP': _choice(IPS, NUM_ROWS)[order],
+        'Accessed_Obj': accessed_obj[order],
+        'Accessed_Obj_Owner': 'dbo',
+        'Statement': statement[order],
+        'MS_Context': context[order]
+    })
+    df[CATEGORICAL_COLUMNS] = df[CATEGORICAL_COLUMNS].astype('category')
     
     return df
 
 def add_realistic_variations(df):
     """Add realistic variations to make data more authentic"""
     
-    # Add some NaN values to simulate real data
-    for col in ['Accessed_Obj', 'MS_Context', 'Program']:
-        if col in df.columns:
-            # Randomly set 2-3% of values to NaN
-            nan_indices = np.random.choice(df.index, size=int(len(df) * 0.025), replace=False)
-            df.loc[nan_indices, col] = np.nan
+    # Add some NaN values to simulate real data: 2.5% of rows per column, drawn in one shuffle
+    nan_columns = [col for col in ['Accessed_Obj', 'MS_Context', 'Program'] if col in df.columns]
+    nan_count = int(len(df) * 0.025)
+    nan_rows = rng.choice(len(df), size=nan_count * len(nan_columns), replace=False).reshape(len(nan_columns), nan_count)
+    for rows, col in zip(nan_rows, nan_columns):
+        df.iloc[rows, df.columns.get_loc(col)] = np.nan
     
     # Add some suspicious patterns
     # User alice.smith has more high-risk activities on weekends
-    alice_weekend_mask = (df['OS_User'] == 'alice.smith') & (df['_time'].dt.weekday >= 5)
+    alice_weekend_rows = np.flatnonzero((df['OS_User'] == 'alice.smith') & (df['_time'].dt.weekday >= 5))
     high_risk_statements = [
         "SELECT * FROM Salaries",
         "UPDATE Payroll SET Amount = Amount * 1.1",
         "DELETE FROM AuditLog WHERE LogDate < GETDATE()-30"
     ]
-    df.loc[alice_weekend_mask.sample(n=min(20, alice_weekend_mask.sum())).index, 'Statement'] = np.random.choice(high_risk_statements, size=min(20, alice_weekend_mask.sum()))
+    alice_rows = rng.choice(alice_weekend_rows, size=min(20, len(alice_weekend_rows)), replace=False)
+    df.iloc[alice_rows, df.columns.get_loc('Statement')] = _choice(high_risk_statements, len(alice_rows))
     
     # Bob has some late-night activities
     bob_mask = df['OS_User'] == 'bob.johnson'
@@ -212,9 +229,10 @@ print("Generating 5000-row test dataset...")
 test_df = generate_test_data()
 test_df = add_realistic_variations(test_df)
 
-# Save to CSV
+# Save to CSV for upload, plus a parquet copy that keeps datetime and category dtypes for the test drivers
 filename = 'test_sql_audit_5000_rows.csv'
 test_df.to_csv(filename, index=False)
+test_df.to_parquet('test_sql_audit_5000_rows.parquet', compression='zstd')
 
 print(f"✅ Generated {filename} with {len(test_df)} rows")
 print("\n📊 Dataset Statistics:")
@@ -10,7 +10,12 @@ from utils.anomaly_detector import AnomalyDetector
 
 # Load test data
 print("Loading test data...")
-df = pd.read_csv('test_sql_audit_5000_rows.csv')
+try:
+    # Parquet copy from test_data_generator.py keeps _time as datetime64
+    df = pd.read_parquet('test_sql_audit_5000_rows.parquet')
+except (FileNotFoundError, ImportError):
+    df = pd.read_csv('test_sql_audit_5000_rows.csv')
+    df['_time'] = pd.to_datetime(df['_time'], format='mixed')
 print(f"Loaded {len(df)} rows")
 
 # Initialize components
@@ -24,7 +29,7 @@ print(f"Testing row: {row['OS_User']} - {row['Statement'][:50]}...")
 # Calculate risk
 SENSITIVE_TABLES = ['Salaries', 'Employees', 'HR_Records', 'CustomerData', 'AuditLog', 'Payroll', 'SSN', 'Credit']
 risk_score = risk_engine.calculate_risk_score(row, SENSITIVE_TABLES)
-anomalies = anomaly_detector.detect_anomalies(row, df)
+anomalies = anomaly_detector.detect_anomalies_batch(df).iloc[0].to_dict()
 
 print(f"Risk score: {risk_score}")
 print(f"Anomalies: {anomalies}")
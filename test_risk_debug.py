@@ -7,7 +7,12 @@ sys.path.append('.')
 from utils.risk_engine import RiskEngine
 
 # Load test data
-df = pd.read_csv('test_sql_audit_5000_rows.csv')
+try:
+    # Parquet copy from test_data_generator.py keeps _time as datetime64
+    df = pd.read_parquet('test_sql_audit_5000_rows.parquet')
+except (FileNotFoundError, ImportError):
+    df = pd.read_csv('test_sql_audit_5000_rows.csv')
+    df['_time'] = pd.to_datetime(df['_time'], format='mixed')
 risk_engine = RiskEngine()
 SENSITIVE_TABLES = ['Salaries', 'Employees', 'HR_Records', 'CustomerData', 'AuditLog', 'Payroll', 'SSN', 'Credit']
 
@@ -16,8 +21,7 @@ print("Analyzing risk score distribution...")
 risk_scores = []
 high_risk_examples = []
 
-for i in range(min(100, len(df))):  # Check first 100 rows
-    row = df.iloc[i]
+for i, row in enumerate(df.head(100).to_dict('records')):  # Check first 100 rows
     score = risk_engine.calculate_risk_score(row, SENSITIVE_TABLES)
     risk_scores.append(score)
     
@@ -1,13 +1,46 @@
 
 import json
 import os
-import pandas as pd
+import sys
 from datetime import time
-import streamlit as st
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is used otherwise
+    orjson = None
+
+# List fields that also get a lowercased frozenset view for membership tests
+LOOKUP_FIELDS = (
+    'sensitive_tables', 'high_risk_keywords', 'low_risk_keywords',
+    'high_risk_programs', 'medium_risk_programs', 'admin_patterns'
+)
+
+def _dump_json(data):
+    """Serialize data to indented JSON bytes in a single call"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode('utf-8')
+
+def _load_json(raw):
+    """Parse JSON from a str or UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _report_error(message):
+    """Show an error in the Streamlit UI, importing it only when an error actually occurs"""
+    try:
+        import streamlit as st
+    except ImportError:
+        print(message, file=sys.stderr)
+        return
+    st.error(message)
 
 class AdminConfig:
     def __init__(self):
         self.config_file = "admin_config.json"
+        self._config_mtime = None
+        self._saved_bytes = None
         self.default_config = {
             "sql_operation_weights": {
                 'DELETE': 30,
@@ -78,53 +111,106 @@ class AdminConfig:
         """Load configuration from file or create default"""
         try:
             if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    self.config = json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    raw = f.read()
+                self.config = _load_json(raw)
+                self._saved_bytes = raw
+                self._config_mtime = os.path.getmtime(self.config_file)
             else:
                 self.config = self.default_config.copy()
                 self.save_config()
         except Exception as e:
-            st.error(f"Error loading config: {e}")
+            _report_error(f"Error loading config: {e}")
             self.config = self.default_config.copy()
+        self._build_derived()
     
     def save_config(self):
-        """Save configuration to file"""
+        """Save configuration to file, skipping the write when nothing changed"""
+        self._build_derived()
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
+            data = _dump_json(self.config)
+            if data == self._saved_bytes and self._file_unchanged():
+                return True
+            # One write to a temp file, then an atomic swap so readers never see a partial file
+            tmp_file = self.config_file + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, self.config_file)
+            self._saved_bytes = data
+            self._config_mtime = os.path.getmtime(self.config_file)
             return True
         except Exception as e:
-            st.error(f"Error saving config: {e}")
+            _report_error(f"Error saving config: {e}")
             return False
     
+    def _file_unchanged(self):
+        """Check the file on disk is still the one this instance last read or wrote"""
+        try:
+            return os.path.getmtime(self.config_file) == self._config_mtime
+        except OSError:
+            return False
+    
+    def _build_derived(self):
+        """Rebuild frozenset views and parsed times; kept off self.config so it still serializes cleanly"""
+        self.lookups = {
+            field: frozenset(str(item).lower() for item in self.config.get(field, []))
+            for field in LOOKUP_FIELDS
+        }
+        self.off_hours_times = {}
+        for key in ('off_hours_start', 'off_hours_end'):
+            try:
+                self.off_hours_times[key] = time.fromisoformat(self.config['time_settings'][key])
+            except (KeyError, TypeError, ValueError):
+                self.off_hours_times[key] = time.fromisoformat(self.default_config['time_settings'][key])
+    
+    def get_lookups(self):
+        """Get lowercased frozensets of the list fields, in sync with the current configuration"""
+        self.get_config()
+        return self.lookups
+    
+    def get_off_hours_times(self):
+        """Get the off-hours start/end as parsed time objects"""
+        self.get_config()
+        return self.off_hours_times
+    
     def reset_to_defaults(self):
         """Reset configuration to defaults"""
         self.config = self.default_config.copy()
         return self.save_config()
     
     def get_config(self):
-        """Get current configuration"""
+        """Get current configuration, reloading only when the file changed on disk"""
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            return self.config
+        if mtime != self._config_mtime:
+            self.load_config()
         return self.config
     
     def update_config(self, section, key, value):
         """Update a specific configuration value"""
         if section in self.config:
             if isinstance(self.config[section], dict) and key in self.config[section]:
+                if self.config[section][key] == value:
+                    return True  # Nothing changed, so there is nothing to flush
                 self.config[section][key] = value
                 return self.save_config()
             elif section == key:  # For top-level arrays like sensitive_tables
+                if self.config[section] == value:
+                    return True
                 self.config[section] = value
                 return self.save_config()
         return False
     
     def export_config(self):
-        """Export configuration as JSON string"""
-        return json.dumps(self.config, indent=2)
+        """Export configuration as UTF-8 encoded JSON bytes"""
+        return _dump_json(self.config)
     
     def import_config(self, config_json):
-        """Import configuration from JSON string"""
+        """Import configuration from a JSON string or raw UTF-8 bytes"""
         try:
-            imported_config = json.loads(config_json)
+            imported_config = _load_json(config_json)
             # Validate structure matches expected format
             if self.validate_config(imported_config):
                 self.config = imported_config
@@ -1,12 +1,26 @@
+import re
+import weakref
 import pandas as pd
 import numpy as np
-from datetime import datetime, time
-from collections import defaultdict, Counter
+from datetime import time
+
+SQL_OPERATIONS = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'GRANT', 'REVOKE', 'TRUNCATE']
+_SQL_OP_RE = re.compile(r'^\s*(' + '|'.join(SQL_OPERATIONS) + ')', re.IGNORECASE)
+# Substring match, like the original `keyword in statement` checks
+_BULK_RE = re.compile('BULK|BATCH|IMPORT|EXPORT|BACKUP|RESTORE')
+
+def off_hours_mask(times, start=time(18, 0), end=time(8, 0)):
+    """Vectorized off-hours check for a datetime Series: weekends, at/after start or at/before end"""
+    time_of_day = times - times.dt.normalize()
+    start = pd.Timedelta(hours=start.hour, minutes=start.minute)
+    end = pd.Timedelta(hours=end.hour, minutes=end.minute)
+    return (times.dt.weekday >= 5) | (time_of_day >= start) | (time_of_day <= end)
 
 class AnomalyDetector:
     def __init__(self):
         self.off_hours_start = time(18, 0)  # 6 PM
         self.off_hours_end = time(8, 0)     # 8 AM
+        self._fitted_ref = None  # weak reference to the frame the statistics were fitted on
         
     def detect_anomalies(self, row, full_df):
         """Detect various types of anomalous behavior"""
@@ -43,8 +57,123 @@ class AnomalyDetector:
             
         return anomalies
     
+    def fit(self, full_df):
+        """Build per-user reference statistics once so rows can be scored in bulk"""
+        users = full_df['OS_User']
+        operations = self._extract_sql_operations(full_df['Statement'])
+        
+        self._user_counts = users.value_counts()
+        self._user_db_counts = full_df.groupby(['OS_User', 'DB_Name'], observed=True).size()
+        self._user_program_counts = full_df.groupby(['OS_User', 'Program'], observed=True).size()
+        self._user_operation_counts = full_df.assign(_operation=operations).groupby(['OS_User', '_operation'], observed=True).size()
+        # Users with an unparseable statement never get the operation-frequency check
+        self._users_with_null_statement = set(users[full_df['Statement'].isna()].dropna())
+        # Plain dicts for the per-row path, which looks up one (user, value) pair at a time
+        self._user_db_lookup = self._user_db_counts.to_dict()
+        self._user_program_lookup = self._user_program_counts.to_dict()
+        self._user_operation_lookup = self._user_operation_counts.to_dict()
+        self._fitted_ref = weakref.ref(full_df)
+        self._user_times = {
+            user: np.sort(times.to_numpy())
+            for user, times in full_df['_time'].groupby(users, observed=True)
+        }
+        return self
+    
+    def score_batch(self, df):
+        """Score every row of df against the fitted baselines, returning one column per anomaly flag"""
+        if self._fitted_ref is None:
+            self.fit(df)
+        
+        times = df['_time']
+        users = df['OS_User']
+        statements = df['Statement'].str.upper()
+        user_counts = self._user_counts.reindex(users).fillna(0).to_numpy()
+        valid = times.notna().to_numpy()
+        
+        # Off-hours: weekends, after 6 PM or before 8 AM
+        off_hours = off_hours_mask(times, self.off_hours_start, self.off_hours_end).to_numpy() & valid
+        
+        # Volume: SELECT *, then queries by the same user in the preceding hour, then bulk keywords
+        has_statement = statements.notna().to_numpy() & (user_counts >= 5)
+        select_star = statements.str.contains('SELECT *', regex=False, na=False).to_numpy()
+        hour_counts = self._count_in_window(users, times, pd.Timedelta(hours=1))
+        high_frequency = hour_counts > 10
+        bulk = statements.str.contains(_BULK_RE, na=False).to_numpy()
+        
+        conditions = [
+            has_statement & select_star,
+            has_statement & high_frequency,
+            has_statement & bulk
+        ]
+        unusual_volume = np.logical_or.reduce(conditions) & valid
+        volume_description = np.select(
+            conditions,
+            [
+                'Potential data dump using SELECT *',
+                np.char.add(np.char.add('High query frequency: ', hour_counts.astype(str)), ' queries in 1 hour'),
+                'Bulk data operation detected'
+            ],
+            default=''
+        )
+        volume_description = np.where(valid, volume_description, '')
+        
+        # Atypical behavior: rare database, unseen program, then rare SQL operation
+        db_share = self._lookup(self._user_db_counts, users, df['DB_Name']) / np.maximum(user_counts, 1)
+        program_seen = self._lookup(self._user_program_counts, users, df['Program']) > 0
+        operations = self._extract_sql_operations(df['Statement'])
+        operation_share = self._lookup(self._user_operation_counts, users, operations) / np.maximum(user_counts, 1)
+        operation_checked = ~users.isin(self._users_with_null_statement).to_numpy()
+        
+        atypical_behavior = (user_counts >= 10) & valid & (
+            (db_share < 0.1) |
+            ~program_seen |
+            (operation_checked & (operation_share < 0.05))
+        )
+        
+        return pd.DataFrame({
+            'is_outlier': off_hours | unusual_volume | atypical_behavior,
+            'off_hours': off_hours,
+            'unusual_volume': unusual_volume,
+            'atypical_behavior': atypical_behavior,
+            'volume_description': volume_description
+        }, index=df.index)
+    
+    def _ensure_fitted(self, full_df):
+        """Fit on full_df unless the current statistics were already built from this frame"""
+        if self._fitted_ref is None or self._fitted_ref() is not full_df:
+            self.fit(full_df)
+    
+    def detect_anomalies_batch(self, full_df):
+        """Detect anomalies for every row of full_df in one pass; the batch form of detect_anomalies"""
+        return self.fit(full_df).score_batch(full_df)
+    
+    def _count_in_window(self, users, times, window):
+        """Count fitted events per user falling within [time - window, time]"""
+        counts = np.zeros(len(times), dtype=np.int64)
+        time_values = times.to_numpy()
+        for user, positions in pd.Series(np.arange(len(times))).groupby(users.to_numpy()):
+            reference = self._user_times.get(user)
+            if reference is None:
+                continue
+            positions = positions.to_numpy()
+            user_times = time_values[positions]
+            counts[positions] = (
+                np.searchsorted(reference, user_times, side='right') -
+                np.searchsorted(reference, user_times - window.to_timedelta64(), side='left')
+            )
+        return counts
+    
+    def _lookup(self, counts, users, values):
+        """Look up (user, value) pair counts, treating unseen pairs as zero"""
+        keys = pd.MultiIndex.from_arrays([users, values])
+        return counts.reindex(keys).fillna(0).to_numpy()
+    
+    def _extract_sql_operations(self, statements):
+        """Vectorized _extract_sql_operation over a Series of statements"""
+        return statements.str.extract(_SQL_OP_RE, expand=False).str.upper().fillna('OTHER')
+    
     def _is_off_hours(self, timestamp):
-        """Check if the timestamp is during off-hours"""
+        """Check if a single timestamp is during off-hours; use off_hours_mask for a Series"""
         current_time = timestamp.time()
         
         # Weekend check
@@ -62,13 +191,13 @@ class AnomalyDetector:
         result = {'is_anomaly': False, 'description': ''}
         
         try:
+            # Per-user counts and sorted times are built once per frame rather than once per row
+            self._ensure_fitted(full_df)
+            
             user = row['OS_User']
             statement = row['Statement'].upper()
             
-            # Filter data for the same user
-            user_df = full_df[full_df['OS_User'] == user]
-            
-            if len(user_df) < 5:  # Not enough data for comparison
+            if self._user_counts.get(user, 0) < 5:  # Not enough data for comparison
                 return result
             
             # Check for SELECT * queries (potential data dumps)
@@ -80,20 +209,23 @@ class AnomalyDetector:
             # Check query frequency within time windows
             current_time = row['_time']
             
-            # Count queries in the last hour
-            hour_window = user_df[
-                (user_df['_time'] >= current_time - pd.Timedelta(hours=1)) &
-                (user_df['_time'] <= current_time)
-            ]
+            # Count queries in the last hour with a binary search over the user's sorted times
+            user_times = self._user_times[user]
+            hour_count = 0
+            if pd.notna(current_time):
+                current = np.datetime64(current_time)
+                hour_count = (
+                    np.searchsorted(user_times, current, side='right') -
+                    np.searchsorted(user_times, current - np.timedelta64(1, 'h'), side='left')
+                )
             
-            if len(hour_window) > 10:  # More than 10 queries per hour
+            if hour_count > 10:  # More than 10 queries per hour
                 result['is_anomaly'] = True
-                result['description'] = f'High query frequency: {len(hour_window)} queries in 1 hour'
+                result['description'] = f'High query frequency: {hour_count} queries in 1 hour'
                 return result
             
             # Check for bulk operations
-            bulk_keywords = ['BULK', 'BATCH', 'IMPORT', 'EXPORT', 'BACKUP', 'RESTORE']
-            if any(keyword in statement for keyword in bulk_keywords):
+            if _BULK_RE.search(statement):
                 result['is_anomaly'] = True
                 result['description'] = 'Bulk data operation detected'
                 return result
@@ -106,19 +238,21 @@ class AnomalyDetector:
     def _detect_atypical_behavior(self, row, full_df):
         """Detect behavior that's atypical for the user"""
         try:
+            # Per-user counts are built once per frame rather than once per row
+            self._ensure_fitted(full_df)
+            
             user = row['OS_User']
-            user_df = full_df[full_df['OS_User'] == user]
+            user_total = self._user_counts.get(user, 0)
             
-            if len(user_df) < 10:  # Not enough historical data
+            if user_total < 10:  # Not enough historical data
                 return False
             
             # Check for unusual database access
-            user_databases = user_df['DB_Name'].value_counts()
-            current_db = row['DB_Name']
+            db_count = self._user_db_lookup.get((user, row['DB_Name']), 0)
             
             # If user rarely accesses this database
-            if current_db in user_databases:
-                access_frequency = user_databases[current_db] / len(user_df)
+            if db_count:
+                access_frequency = db_count / user_total
                 if access_frequency < 0.1:  # Less than 10% of their usual activity
                     return True
             else:
@@ -126,18 +260,17 @@ class AnomalyDetector:
                 return True
             
             # Check for unusual programs
-            user_programs = user_df['Program'].value_counts()
-            current_program = row['Program']
-            
-            if current_program not in user_programs.index:
+            if not self._user_program_lookup.get((user, row['Program']), 0):
                 return True  # First time using this program
             
             # Check for unusual SQL operations
-            user_operations = user_df['Statement'].apply(self._extract_sql_operation).value_counts()
+            if user in self._users_with_null_statement:
+                return False  # No reliable operation history for this user
             current_operation = self._extract_sql_operation(row['Statement'])
+            operation_count = self._user_operation_lookup.get((user, current_operation), 0)
             
-            if current_operation in user_operations:
-                operation_frequency = user_operations[current_operation] / len(user_df)
+            if operation_count:
+                operation_frequency = operation_count / user_total
                 if operation_frequency < 0.05:  # Less than 5% of their usual operations
                     return True
             
@@ -148,15 +281,8 @@ class AnomalyDetector:
     
     def _extract_sql_operation(self, statement):
         """Extract the primary SQL operation from a statement"""
-        s = statement.upper().strip()
-        
-        operations = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'GRANT', 'REVOKE', 'TRUNCATE']
-        
-        for op in operations:
-            if s.startswith(op):
-                return op
-        
-        return 'OTHER'
+        match = _SQL_OP_RE.match(statement)
+        return match.group(1).upper() if match else 'OTHER'
     
     def get_user_behavior_profile(self, user, full_df):
         """Get a behavioral profile for a user"""
@@ -169,9 +295,9 @@ class AnomalyDetector:
             'total_activities': len(user_df),
             'databases_accessed': user_df['DB_Name'].nunique(),
             'common_databases': user_df['DB_Name'].value_counts().head(3).to_dict(),
-            'common_operations': user_df['Statement'].apply(self._extract_sql_operation).value_counts().head(3).to_dict(),
+            'common_operations': self._extract_sql_operations(user_df['Statement']).value_counts().head(3).to_dict(),
             'common_programs': user_df['Program'].value_counts().head(3).to_dict(),
-            'off_hours_percentage': (user_df['_time'].apply(self._is_off_hours).sum() / len(user_df)) * 100,
+            'off_hours_percentage': off_hours_mask(user_df['_time'], self.off_hours_start, self.off_hours_end).mean() * 100,
             'weekend_activities': user_df[user_df['_time'].dt.weekday >= 5].shape[0],
             'most_active_hours': user_df['_time'].dt.hour.value_counts().head(3).to_dict()
         }
@@ -185,34 +311,47 @@ class AnomalyDetector:
         try:
             # Group activities by time windows
             full_df_sorted = full_df.sort_values('_time')
+            times = full_df_sorted['_time']
+            time_values = times.to_numpy()
+            window = np.timedelta64(time_window_minutes, 'm')
+            
+            # Each row's window is a contiguous slice of the sorted times
+            lo = np.searchsorted(time_values, time_values - window, side='left')
+            hi = np.searchsorted(time_values, time_values + window, side='right')
+            hi = np.where(times.notna().to_numpy(), hi, lo)
+            counts = hi - lo
+            
+            # Expand the windows into (row, other) pairs
+            rows = np.repeat(np.arange(len(full_df_sorted)), counts)
+            others = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+            
+            # Missing values never match, and a missing user differs from everyone
+            users = pd.factorize(full_df_sorted['OS_User'])[0]
+            databases = pd.factorize(full_df_sorted['DB_Name'])[0]
+            objects = pd.factorize(full_df_sorted['Accessed_Obj'])[0]
+            different_user = (users[rows] != users[others]) | (users[rows] < 0)
+            same_database = (databases[rows] == databases[others]) & (databases[rows] >= 0)
+            same_object = (objects[rows] == objects[others]) & (objects[rows] >= 0)
+            similar = different_user & (same_database | same_object)
+            rows, others = rows[similar], others[similar]
+            
+            similar_counts = np.bincount(rows, minlength=len(full_df_sorted))
+            user_values = full_df_sorted['OS_User'].to_numpy()
+            database_values = full_df_sorted['DB_Name'].to_numpy()
+            object_values = full_df_sorted['Accessed_Obj'].to_numpy()
+            # Pairs are grouped by row, so each row's matches are one slice of `others`
+            ends = np.cumsum(similar_counts)
             
-            for i, row in full_df_sorted.iterrows():
-                current_time = row['_time']
-                window_start = current_time - pd.Timedelta(minutes=time_window_minutes)
-                window_end = current_time + pd.Timedelta(minutes=time_window_minutes)
-                
-                # Find other activities in the same time window
-                window_activities = full_df_sorted[
-                    (full_df_sorted['_time'] >= window_start) &
-                    (full_df_sorted['_time'] <= window_end) &
-                    (full_df_sorted['OS_User'] != row['OS_User'])  # Different users
-                ]
-                
-                # Check for similar activities
-                similar_activities = window_activities[
-                    (window_activities['DB_Name'] == row['DB_Name']) |
-                    (window_activities['Accessed_Obj'] == row['Accessed_Obj'])
-                ]
-                
-                if len(similar_activities) >= 2:  # At least 2 other users doing similar things
-                    coordinated_events.append({
-                        'primary_user': row['OS_User'],
-                        'primary_time': current_time,
-                        'coordinated_users': similar_activities['OS_User'].tolist(),
-                        'database': row['DB_Name'],
-                        'object': row['Accessed_Obj'],
-                        'total_users_involved': len(similar_activities) + 1
-                    })
+            for i in np.flatnonzero(similar_counts >= 2):  # At least 2 other users doing similar things
+                matches = others[ends[i] - similar_counts[i]:ends[i]]
+                coordinated_events.append({
+                    'primary_user': user_values[i],
+                    'primary_time': times.iloc[i],
+                    'coordinated_users': user_values[matches].tolist(),
+                    'database': database_values[i],
+                    'object': object_values[i],
+                    'total_users_involved': int(similar_counts[i]) + 1
+                })
                     
         except Exception:
             pass
@@ -1,11 +1,255 @@
+import re
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
-import plotly.figure_factory as ff
+from collections import defaultdict
+from itertools import chain, compress, repeat
+from utils.risk_engine import top_risk_indices
+
+# Anomaly flags in bit order; every combination's label is joined once at import
+ANOMALY_KEYS = ('off_hours', 'unusual_volume', 'atypical_behavior')
+
+def _build_label_table(labels, separator=" | "):
+    """Precompute the joined label for each anomaly bitmap value"""
+    return tuple(
+        separator.join(label for bit, label in enumerate(labels) if bits >> bit & 1)
+        for bits in range(1 << len(labels))
+    )
+
+EVENT_ALERT_LABELS = _build_label_table(("⏰ Off-hours access", "📊 Unusual volume", "🔍 Atypical behavior"))
+STORY_ALERT_LABELS = _build_label_table(("⏰ Off-hours", "📊 High volume", "🔍 Unusual pattern"))
+
+# Tables counted as sensitive in the database storyline, matched as case-insensitive substrings
+SENSITIVE_TABLE_RE = re.compile('salaries|employees|hr_records|customerdata|auditlog', re.IGNORECASE)
+
+# Columns the user and database storylines read; rows are selected together with this projection
+STORY_COLUMNS = ['_time', '_hour', 'OS_User', 'DB_Name', 'Program', 'Accessed_Obj', 'MS_Context', 'Explanation']
+
+# Risk indicators indexed by bucket: low (<40), medium (40-69), high (>=70)
+RISK_EMOJIS = np.array(["🟢", "🟠", "🔴"], dtype=object)
+
+def risk_emojis(scores):
+    """Risk indicator for each score, bucketed in one pass"""
+    return RISK_EMOJIS[np.digitize(scores, [40, 70])]
+
+# Storyline period names indexed by hour // 6
+DAY_PERIOD_LABELS = np.array([
+    "Night (12 AM - 6 AM)", "Morning (6 AM - 12 PM)", "Afternoon (12 PM - 6 PM)", "Evening (6 PM - 12 AM)"
+], dtype=object)
+
+def anomaly_bits(anomalies):
+    """Encode an anomaly dict as a bitmap over ANOMALY_KEYS"""
+    return sum(1 << bit for bit, key in enumerate(ANOMALY_KEYS) if anomalies.get(key))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _executive_aggregates(frame, risk_scores):
+    """Risk buckets, hourly counts and per-user/per-database risk tables for the executive dashboard"""
+    scores = np.asarray(risk_scores)
+    low, medium, high = np.bincount(np.digitize(scores, [40, 70]), minlength=3).tolist()
+    risk_levels = {'Low (0-39)': low, 'Medium (40-69)': medium, 'High (70-100)': high}
+    
+    hours = frame['_hour'].to_numpy()
+    hourly_counts = np.bincount(hours[hours >= 0], minlength=24).astype(np.int32)
+    
+    # Group on category codes rather than hashing the user/database strings
+    scored = frame.assign(
+        risk_score=scores,
+        OS_User=frame['OS_User'].astype('category'),
+        DB_Name=frame['DB_Name'].astype('category')
+    )
+    user_avg_risk = scored.groupby('OS_User', observed=True, sort=False)['risk_score'].agg(['mean', 'count']).reset_index()
+    user_avg_risk.columns = ['User', 'Avg_Risk', 'Event_Count']
+    user_avg_risk = user_avg_risk.sort_values('Avg_Risk', ascending=False).head(10)
+    
+    db_avg_risk = scored.groupby('DB_Name', observed=True, sort=False)['risk_score'].agg(['mean', 'count']).reset_index()
+    db_avg_risk.columns = ['Database', 'Avg_Risk', 'Event_Count']
+    db_avg_risk = db_avg_risk.sort_values('Avg_Risk', ascending=False).head(10)
+    
+    return risk_levels, hourly_counts, user_avg_risk, db_avg_risk
+
+# Chart styling shared across reruns, passed straight to go.Figure
+RISK_LEVEL_COLORS = {'Low (0-39)': '#2ecc71', 'Medium (40-69)': '#f39c12', 'High (70-100)': '#e74c3c'}
+PIE_LAYOUT = dict(title="Risk Distribution")
+HOURS_OF_DAY = np.arange(24, dtype=np.int8)
+BAR_LAYOUT = dict(title="Activity by Hour of Day", xaxis_title="Hour", yaxis_title="Activities", showlegend=False)
+SCATTER_LAYOUT = dict(title="High-Risk Events Timeline", xaxis_title="_time", yaxis_title="OS_User", height=400)
+HEATMAP_LAYOUT = dict(xaxis_title="Hour of Day", yaxis_title="User", yaxis_autorange="reversed", height=300)
+SCATTER_HOVER = (
+    "_time=%{x}<br>OS_User=%{y}<br>risk_score=%{customdata[2]}"
+    "<br>DB_Name=%{customdata[0]}<br>Accessed_Obj=%{customdata[1]}<extra></extra>"
+)
+
+def select_events(mask, risk_scores, anomaly_data):
+    """Scores and anomaly dicts for the rows a boolean mask picks; both inputs align with frame rows by position"""
+    return np.asarray(risk_scores)[mask], list(compress(anomaly_data, mask))
+
+def anomaly_flags(anomaly_data):
+    """Columnar view of anomaly data: one bool array per ANOMALY_KEYS entry"""
+    if isinstance(anomaly_data, pd.DataFrame):
+        return {key: anomaly_data[key].to_numpy(dtype=bool) for key in ANOMALY_KEYS}
+    return {
+        key: np.fromiter((anomaly.get(key, False) for anomaly in anomaly_data), dtype=bool, count=len(anomaly_data))
+        for key in ANOMALY_KEYS
+    }
+
+# Timeline markup for the user storyline; the iframe needs its own copy of the CSS
+TIMELINE_CSS = """
+<style>
+.timeline-container {
+    position: relative;
+    margin: 40px 0;
+    padding: 20px 0;
+    min-height: 400px;
+    overflow-x: auto;
+}
+
+.timeline-line {
+    position: absolute;
+    top: 80px;
+    left: 5%;
+    right: 5%;
+    height: 8px;
+    background: linear-gradient(90deg, #f39c12 0%, #e74c3c 25%, #3498db 50%, #9b59b6 75%, #f39c12 100%);
+    border-radius: 4px;
+    z-index: 1;
+}
+
+.timeline-events {
+    display: flex;
+    justify-content: space-between;
+    position: relative;
+    z-index: 2;
+    margin-top: 40px;
+    min-width: 100%;
+    padding: 0 5%;
+}
+
+.timeline-event {
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    text-align: center;
+    flex: 1;
+    margin: 0 5px;
+    min-width: 140px;
+}
+
+.event-icon {
+    width: 60px;
+    height: 60px;
+    border-radius: 50%;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    font-size: 24px;
+    color: white;
+    margin-bottom: 10px;
+    box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+    position: relative;
+    z-index: 3;
+}
+
+.event-high-risk {
+    background: linear-gradient(135deg, #e74c3c, #c0392b);
+}
+
+.event-medium-risk {
+    background: linear-gradient(135deg, #f39c12, #e67e22);
+}
+
+.event-low-risk {
+    background: linear-gradient(135deg, #2ecc71, #27ae60);
+}
+
+.event-time {
+    font-weight: bold;
+    color: #2c3e50;
+    margin-bottom: 5px;
+    font-size: 14px;
+}
+
+.event-description {
+    font-size: 11px;
+    color: #7f8c8d;
+    max-width: 130px;
+    line-height: 1.3;
+    word-wrap: break-word;
+    overflow-wrap: break-word;
+    margin-bottom: 5px;
+}
+
+.event-risk {
+    font-size: 11px;
+    font-weight: bold;
+    margin-top: 5px;
+    padding: 2px 8px;
+    border-radius: 10px;
+    color: white;
+}
+
+.risk-high { background: #e74c3c; }
+.risk-medium { background: #f39c12; }
+.risk-low { background: #2ecc71; }
+
+.timeline-title {
+    text-align: center;
+    margin-bottom: 40px;
+    color: #2c3e50;
+    font-size: 18px;
+    font-weight: bold;
+    padding: 0 20px;
+}
+
+@media (max-width: 768px) {
+    .timeline-events {
+        flex-wrap: wrap;
+        justify-content: center;
+    }
+    
+    .timeline-event {
+        margin: 10px;
+        min-width: 120px;
+    }
+    
+    .timeline-line {
+        display: none;
+    }
+}
+</style>
+"""
+
+TIMELINE_HEADER = """
+<div class="timeline-container">
+    <div class="timeline-title">Security Events Timeline for {user}</div>
+    <div class="timeline-line"></div>
+    <div class="timeline-events">
+"""
+
+TIMELINE_EVENT = """
+        <div class="timeline-event">
+            <div class="event-icon {risk_class}">
+                {icon}
+            </div>
+            <div class="event-time">{time_str}</div>
+            <div class="event-time">{date_str}</div>
+            <div class="event-description">
+                {action}...
+            </div>
+            <div class="event-description">
+                <strong>{db_name}</strong><br/>
+                {accessed_obj}...
+            </div>
+            <div class="event-risk {risk_label}">
+                Risk: {risk_score:.0f}
+            </div>
+        </div>
+"""
+
+TIMELINE_FOOTER = """
+    </div>
+</div>
+"""
 
 class Dashboard:
     def __init__(self, risk_engine, anomaly_detector):
@@ -14,10 +258,9 @@ class Dashboard:
         
     def create_user_storyline(self, df, user, risk_scores, anomaly_data):
         """Create a professional storyline for a specific user"""
-        user_df = df[df['OS_User'] == user].copy()
-        user_indices = df[df['OS_User'] == user].index
-        user_risk_scores = [risk_scores[i] for i in range(len(df)) if df.iloc[i]['OS_User'] == user]
-        user_anomalies = [anomaly_data[i] for i in range(len(df)) if df.iloc[i]['OS_User'] == user]
+        mask = df['OS_User'].to_numpy() == user
+        user_df = df.loc[mask, STORY_COLUMNS]
+        user_risk_scores, user_anomalies = select_events(mask, risk_scores, anomaly_data)
         
         if user_df.empty:
             return None
@@ -32,10 +275,10 @@ class Dashboard:
         with col1:
             st.metric("Total Activities", len(user_df))
         with col2:
-            avg_risk = np.mean(user_risk_scores) if user_risk_scores else 0
+            avg_risk = user_risk_scores.mean() if len(user_risk_scores) else 0
             st.metric("Average Risk", f"{avg_risk:.1f}")
         with col3:
-            high_risk_count = sum(1 for score in user_risk_scores if score >= 70)
+            high_risk_count = int((user_risk_scores >= 70).sum())
             st.metric("High Risk Events", high_risk_count)
         with col4:
             unique_dbs = user_df['DB_Name'].nunique()
@@ -59,10 +302,9 @@ class Dashboard:
     
     def create_database_storyline(self, df, database, risk_scores, anomaly_data):
         """Create a professional storyline for a specific database"""
-        db_df = df[df['DB_Name'] == database].copy()
-        db_indices = df[df['DB_Name'] == database].index
-        db_risk_scores = [risk_scores[i] for i in range(len(df)) if df.iloc[i]['DB_Name'] == database]
-        db_anomalies = [anomaly_data[i] for i in range(len(df)) if df.iloc[i]['DB_Name'] == database]
+        mask = df['DB_Name'].to_numpy() == database
+        db_df = df.loc[mask, STORY_COLUMNS]
+        db_risk_scores, db_anomalies = select_events(mask, risk_scores, anomaly_data)
         
         if db_df.empty:
             return None
@@ -77,12 +319,10 @@ class Dashboard:
             unique_users = db_df['OS_User'].nunique()
             st.metric("Unique Users", unique_users)
         with col3:
-            avg_risk = np.mean(db_risk_scores) if db_risk_scores else 0
+            avg_risk = db_risk_scores.mean() if len(db_risk_scores) else 0
             st.metric("Average Risk", f"{avg_risk:.1f}")
         with col4:
-            sensitive_access = sum(1 for _, row in db_df.iterrows() 
-                                 if pd.notna(row['Accessed_Obj']) and any(table.lower() in str(row['Accessed_Obj']).lower() 
-                                       for table in ['salaries', 'employees', 'hr_records', 'customerdata', 'auditlog']))
+            sensitive_access = int(db_df['Accessed_Obj'].str.contains(SENSITIVE_TABLE_RE, na=False).sum())
             st.metric("Sensitive Access", sensitive_access)
         
         # User activity heatmap
@@ -105,54 +345,52 @@ class Dashboard:
             **Why it matters:** Helps identify behavioral anomalies and potential insider threat patterns.
             """)
         
-        user_activity = db_df.groupby(['OS_User', db_df['_time'].dt.hour]).size().reset_index()
-        user_activity.columns = ['User', 'Hour', 'Activities']
-        
-        if not user_activity.empty:
-            pivot_table = user_activity.pivot(index='User', columns='Hour', values='Activities').fillna(0)
-            
-            fig = px.imshow(
-                pivot_table,
-                labels=dict(x="Hour of Day", y="User", color="Activities"),
-                title=f"User Activity Heatmap - {database}",
-                color_continuous_scale="Reds"
+        # Users x 24 hours count matrix filled directly from factorized codes
+        hours = db_df['_hour']
+        valid = db_df['OS_User'].notna() & (hours >= 0)
+        user_codes, heatmap_users = pd.factorize(db_df.loc[valid, 'OS_User'], sort=True)
+        user_activity = np.zeros((len(heatmap_users), 24), dtype=np.int32)
+        np.add.at(user_activity, (user_codes, hours[valid].to_numpy(dtype=np.intp)), 1)
+        
+        if len(heatmap_users):
+            fig = go.Figure(
+                go.Heatmap(
+                    z=user_activity,
+                    x=HOURS_OF_DAY,
+                    y=list(heatmap_users),
+                    colorscale="Reds",
+                    colorbar=dict(title="Activities"),
+                    hovertemplate="Hour of Day: %{x}<br>User: %{y}<br>Activities: %{z}<extra></extra>"
+                ),
+                layout=dict(HEATMAP_LAYOUT, title=f"User Activity Heatmap - {database}")
             )
-            fig.update_layout(height=300)
             st.plotly_chart(fig, use_container_width=True)
         
         # Top suspicious activities
         st.markdown("### ⚠️ Notable Activities")
         
         # Sort by risk score and show top events
-        db_df_with_risk = db_df.copy()
-        db_df_with_risk['risk_score'] = db_risk_scores
-        db_df_with_risk['anomalies'] = db_anomalies
-        
-        top_events = db_df_with_risk.nlargest(5, 'risk_score')
-        
-        for _, event in top_events.iterrows():
-            risk_color = "🔴" if event['risk_score'] >= 70 else "🟠" if event['risk_score'] >= 40 else "🟢"
-            
+        top = top_risk_indices(db_risk_scores, 5)
+        top_events = db_df.iloc[top].assign(
+            risk_score=db_risk_scores[top],
+            anomalies=[db_anomalies[i] for i in top]
+        )
+        
+        # Record dicts rather than itertuples: the underscore-prefixed story columns are not valid tuple fields
+        for event, risk_color in zip(top_events.to_dict('records'), risk_emojis(top_events['risk_score'].to_numpy())):
             with st.container():
                 st.markdown(f"""
                 **{risk_color} Risk {event['risk_score']:.0f}/100** - {event['OS_User']} accessed {event['Accessed_Obj']} 
                 at {event['_time'].strftime('%Y-%m-%d %H:%M')}
                 
-                *{self.risk_engine.explain_sql(event['Statement'])}*
+                *{event['Explanation']}*
                 
                 **Context:** {event['MS_Context']}
                 """)
                 
-                anomaly_flags = []
-                if event['anomalies'].get('off_hours'):
-                    anomaly_flags.append("⏰ Off-hours access")
-                if event['anomalies'].get('unusual_volume'):
-                    anomaly_flags.append("📊 Unusual volume")
-                if event['anomalies'].get('atypical_behavior'):
-                    anomaly_flags.append("🔍 Atypical behavior")
-                
-                if anomaly_flags:
-                    st.warning(" | ".join(anomaly_flags))
+                anomaly_alerts = EVENT_ALERT_LABELS[anomaly_bits(event['anomalies'])]
+                if anomaly_alerts:
+                    st.warning(anomaly_alerts)
                 
                 st.divider()
         
@@ -165,6 +403,12 @@ class Dashboard:
         if df.empty:
             st.warning("No data available for dashboard")
             return
+        
+        # Only the columns the aggregates read are hashed for the cache key
+        risk_levels, hourly_counts, user_avg_risk, db_avg_risk = _executive_aggregates(
+            df[['_hour', 'OS_User', 'DB_Name']], np.asarray(risk_scores)
+        )
+        flags = anomaly_flags(anomaly_data)
     
         # Key metrics row
         col1, col2, col3, col4, col5 = st.columns(5)
@@ -174,7 +418,7 @@ class Dashboard:
             st.metric("Total Events", f"{total_events:,}")
         
         with col2:
-            high_risk_count = sum(1 for score in risk_scores if score >= 70)
+            high_risk_count = risk_levels['High (70-100)']
             risk_percentage = (high_risk_count / total_events * 100) if total_events > 0 else 0
             st.metric("High Risk Events", high_risk_count, f"{risk_percentage:.1f}%")
         
@@ -187,7 +431,7 @@ class Dashboard:
             st.metric("Databases", unique_dbs)
         
         with col5:
-            off_hours_count = sum(1 for anomaly in anomaly_data if anomaly.get('off_hours', False))
+            off_hours_count = int(flags['off_hours'].sum())
             st.metric("Off-Hours Access", off_hours_count)
     
         # Risk distribution chart
@@ -207,21 +451,13 @@ class Dashboard:
                 **Why it matters:** Helps identify the overall security posture and proportion of concerning activities.
                 """)
             
-            risk_levels = {
-                'Low (0-39)': sum(1 for score in risk_scores if score < 40),
-                'Medium (40-69)': sum(1 for score in risk_scores if 40 <= score < 70),
-                'High (70-100)': sum(1 for score in risk_scores if score >= 70)
-            }
-            
-            fig = px.pie(
-                values=list(risk_levels.values()),
-                names=list(risk_levels.keys()),
-                title="Risk Distribution",
-                color_discrete_map={
-                    'Low (0-39)': '#2ecc71',
-                    'Medium (40-69)': '#f39c12',
-                    'High (70-100)': '#e74c3c'
-                }
+            fig = go.Figure(
+                go.Pie(
+                    values=np.fromiter(risk_levels.values(), dtype=np.int32, count=len(risk_levels)),
+                    labels=list(risk_levels.keys()),
+                    marker_colors=[RISK_LEVEL_COLORS[level] for level in risk_levels]
+                ),
+                layout=PIE_LAYOUT
             )
             st.plotly_chart(fig, use_container_width=True)
         
@@ -239,20 +475,18 @@ class Dashboard:
                 **Why it matters:** Unusual timing patterns can indicate insider threats, unauthorized access, or compromised accounts.
                 """)
             
-            # Activity by hour
-            df['hour'] = df['_time'].dt.hour
-            hourly_activity = df.groupby('hour').size().reset_index()
-            hourly_activity.columns = ['Hour', 'Activities']
-            
-            fig = px.bar(
-                hourly_activity,
-                x='Hour',
-                y='Activities',
-                title="Activity by Hour of Day",
-                color='Activities',
-                color_continuous_scale="Blues"
+            fig = go.Figure(
+                go.Bar(
+                    x=HOURS_OF_DAY,
+                    y=hourly_counts,
+                    marker=dict(
+                        color=hourly_counts,
+                        colorscale="Blues",
+                        colorbar=dict(title="Activities")
+                    )
+                ),
+                layout=BAR_LAYOUT
             )
-            fig.update_layout(showlegend=False)
             st.plotly_chart(fig, use_container_width=True)
         
         # Top risk users and databases
@@ -260,36 +494,25 @@ class Dashboard:
         
         with col1:
             st.markdown("### 👤 Top Risk Users")
-            user_risks = df.copy()
-            user_risks['risk_score'] = risk_scores
-            user_avg_risk = user_risks.groupby('OS_User')['risk_score'].agg(['mean', 'count']).reset_index()
-            user_avg_risk.columns = ['User', 'Avg_Risk', 'Event_Count']
-            user_avg_risk = user_avg_risk.sort_values('Avg_Risk', ascending=False).head(10)
-            
-            for _, user in user_avg_risk.iterrows():
-                risk_color = "🔴" if user['Avg_Risk'] >= 70 else "🟠" if user['Avg_Risk'] >= 40 else "🟢"
-                st.write(f"{risk_color} **{user['User']}** - {user['Avg_Risk']:.1f} avg risk ({user['Event_Count']} events)")
+            for user, risk_color in zip(user_avg_risk.itertuples(index=False), risk_emojis(user_avg_risk['Avg_Risk'].to_numpy())):
+                st.write(f"{risk_color} **{user.User}** - {user.Avg_Risk:.1f} avg risk ({user.Event_Count} events)")
         
         with col2:
             st.markdown("### 🗄️ Database Risk Profile")
-            db_risks = df.copy()
-            db_risks['risk_score'] = risk_scores
-            db_avg_risk = db_risks.groupby('DB_Name')['risk_score'].agg(['mean', 'count']).reset_index()
-            db_avg_risk.columns = ['Database', 'Avg_Risk', 'Event_Count']
-            db_avg_risk = db_avg_risk.sort_values('Avg_Risk', ascending=False).head(10)
-            
-            for _, db in db_avg_risk.iterrows():
-                risk_color = "🔴" if db['Avg_Risk'] >= 70 else "🟠" if db['Avg_Risk'] >= 40 else "🟢"
-                st.write(f"{risk_color} **{db['Database']}** - {db['Avg_Risk']:.1f} avg risk ({db['Event_Count']} events)")
+            for db, risk_color in zip(db_avg_risk.itertuples(index=False), risk_emojis(db_avg_risk['Avg_Risk'].to_numpy())):
+                st.write(f"{risk_color} **{db.Database}** - {db.Avg_Risk:.1f} avg risk ({db.Event_Count} events)")
         
         # Recent high-risk timeline
         st.markdown("### 🚨 Recent High-Risk Activities")
         
-        df_with_risk = df.copy()
-        df_with_risk['risk_score'] = risk_scores
-        df_with_risk['anomalies'] = anomaly_data
-        
-        high_risk_events = df_with_risk[df_with_risk['risk_score'] >= 70].sort_values('_time', ascending=False).head(10)
+        # Project the plotted columns before attaching scores so the full frame is never copied
+        scores = np.asarray(risk_scores)
+        high_risk = scores >= 70
+        high_risk_events = (
+            df.loc[high_risk, ['_time', 'OS_User', 'DB_Name', 'Accessed_Obj']]
+            .assign(risk_score=scores[high_risk])
+            .nlargest(10, '_time')
+        )
         
         if not high_risk_events.empty:
             st.markdown("#### High-Risk Events Timeline")
@@ -312,49 +535,50 @@ class Dashboard:
                 """)
             
             # Create timeline visualization
-            fig = px.scatter(
-                high_risk_events,
-                x='_time',
-                y='OS_User',
-                size='risk_score',
-                color='risk_score',
-                hover_data=['DB_Name', 'Accessed_Obj'],
-                title="High-Risk Events Timeline",
-                color_continuous_scale="Reds",
-                size_max=20
+            scores = high_risk_events['risk_score']
+            fig = go.Figure(
+                go.Scatter(
+                    x=high_risk_events['_time'],
+                    y=high_risk_events['OS_User'],
+                    mode='markers',
+                    marker=dict(
+                        size=scores,
+                        sizemode='area',
+                        sizeref=2.0 * scores.max() / 20 ** 2,  # largest marker 20px, as px size_max=20
+                        color=scores,
+                        colorscale="Reds",
+                        colorbar=dict(title="risk_score")
+                    ),
+                    customdata=high_risk_events[['DB_Name', 'Accessed_Obj', 'risk_score']],
+                    hovertemplate=SCATTER_HOVER
+                ),
+                layout=SCATTER_LAYOUT
             )
-            fig.update_layout(height=400)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.success("No high-risk events detected in the current dataset.")
     
     def _group_by_time_periods(self, df, risk_scores, anomalies):
         """Group activities by logical time periods for storytelling"""
-        periods = {}
+        periods = defaultdict(list)
         
-        for i, (_, row) in enumerate(df.iterrows()):
-            time_str = row['_time'].strftime('%Y-%m-%d')
-            hour = row['_time'].hour
-            
-            # Determine time period
-            if 6 <= hour < 12:
-                period_key = f"{time_str} Morning (6 AM - 12 PM)"
-            elif 12 <= hour < 18:
-                period_key = f"{time_str} Afternoon (12 PM - 6 PM)"
-            elif 18 <= hour < 24:
-                period_key = f"{time_str} Evening (6 PM - 12 AM)"
-            else:
-                period_key = f"{time_str} Night (12 AM - 6 AM)"
-            
-            if period_key not in periods:
-                periods[period_key] = []
-            
-            activity = {
+        # Period keys are built for the whole column; hour // 6 picks the quarter of the day
+        period_keys = df['_time'].dt.strftime('%Y-%m-%d ') + DAY_PERIOD_LABELS[df['_hour'].to_numpy() // 6]
+        
+        # Events beyond the supplied scores/anomalies fall back to no risk and no alerts
+        scores = chain(risk_scores, repeat(0))
+        colors = chain(risk_emojis(risk_scores), repeat(RISK_EMOJIS[0]))
+        anomaly_iter = chain(anomalies, repeat({}))
+        
+        for period_key, row, risk_score, risk_color, anomaly in zip(
+            period_keys, df.to_dict('records'), scores, colors, anomaly_iter
+        ):
+            periods[period_key].append({
                 'row': row,
-                'risk_score': risk_scores[i] if i < len(risk_scores) else 0,
-                'anomalies': anomalies[i] if i < len(anomalies) else {}
-            }
-            periods[period_key].append(activity)
+                'risk_score': risk_score,
+                'risk_color': risk_color,
+                'anomalies': anomaly
+            })
         
         return periods
     
@@ -362,14 +586,12 @@ class Dashboard:
         """Render a single activity as part of the storyline"""
         row = activity['row']
         risk_score = activity['risk_score']
+        risk_color = activity['risk_color']
         anomalies = activity['anomalies']
         
-        # Risk color indicator
-        risk_color = "🔴" if risk_score >= 70 else "🟠" if risk_score >= 40 else "🟢"
-        
         # Build the narrative
         time_str = row['_time'].strftime('%H:%M')
-        action = self.risk_engine.explain_sql(row['Statement'])
+        action = row['Explanation']
         
         narrative = f"**{time_str}** - {risk_color} Risk {risk_score:.0f}/100"
         narrative += f"\n\n{row['OS_User']} {action} on `{row['Accessed_Obj']}` in {row['DB_Name']} database using {row['Program']}."
@@ -379,16 +601,9 @@ class Dashboard:
             narrative += f"\n\n*Context: {row['MS_Context']}*"
         
         # Add anomaly indicators
-        anomaly_flags = []
-        if anomalies.get('off_hours'):
-            anomaly_flags.append("⏰ Off-hours")
-        if anomalies.get('unusual_volume'):
-            anomaly_flags.append("📊 High volume")
-        if anomalies.get('atypical_behavior'):
-            anomaly_flags.append("🔍 Unusual pattern")
-        
-        if anomaly_flags:
-            narrative += f"\n\n**Alerts:** {' | '.join(anomaly_flags)}"
+        anomaly_alerts = STORY_ALERT_LABELS[anomaly_bits(anomalies)]
+        if anomaly_alerts:
+            narrative += f"\n\n**Alerts:** {anomaly_alerts}"
         
         # Display with appropriate styling
         if risk_score >= 70:
@@ -429,149 +644,18 @@ class Dashboard:
         # Sort by time and get key events
         sorted_df = user_df.sort_values('_time').reset_index(drop=True)
         
-        # Create timeline HTML/CSS
-        timeline_html = f"""
-        <style>
-        .timeline-container {{
-            position: relative;
-            margin: 40px 0;
-            padding: 20px 0;
-            min-height: 400px;
-            overflow-x: auto;
-        }}
-        
-        .timeline-line {{
-            position: absolute;
-            top: 80px;
-            left: 5%;
-            right: 5%;
-            height: 8px;
-            background: linear-gradient(90deg, #f39c12 0%, #e74c3c 25%, #3498db 50%, #9b59b6 75%, #f39c12 100%);
-            border-radius: 4px;
-            z-index: 1;
-        }}
-        
-        .timeline-events {{
-            display: flex;
-            justify-content: space-between;
-            position: relative;
-            z-index: 2;
-            margin-top: 40px;
-            min-width: 100%;
-            padding: 0 5%;
-        }}
-        
-        .timeline-event {{
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            text-align: center;
-            flex: 1;
-            margin: 0 5px;
-            min-width: 140px;
-        }}
-        
-        .event-icon {{
-            width: 60px;
-            height: 60px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 24px;
-            color: white;
-            margin-bottom: 10px;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-            position: relative;
-            z-index: 3;
-        }}
-        
-        .event-high-risk {{
-            background: linear-gradient(135deg, #e74c3c, #c0392b);
-        }}
-        
-        .event-medium-risk {{
-            background: linear-gradient(135deg, #f39c12, #e67e22);
-        }}
-        
-        .event-low-risk {{
-            background: linear-gradient(135deg, #2ecc71, #27ae60);
-        }}
-        
-        .event-time {{
-            font-weight: bold;
-            color: #2c3e50;
-            margin-bottom: 5px;
-            font-size: 14px;
-        }}
-        
-        .event-description {{
-            font-size: 11px;
-            color: #7f8c8d;
-            max-width: 130px;
-            line-height: 1.3;
-            word-wrap: break-word;
-            overflow-wrap: break-word;
-            margin-bottom: 5px;
-        }}
-        
-        .event-risk {{
-            font-size: 11px;
-            font-weight: bold;
-            margin-top: 5px;
-            padding: 2px 8px;
-            border-radius: 10px;
-            color: white;
-        }}
-        
-        .risk-high {{ background: #e74c3c; }}
-        .risk-medium {{ background: #f39c12; }}
-        .risk-low {{ background: #2ecc71; }}
-        
-        .timeline-title {{
-            text-align: center;
-            margin-bottom: 40px;
-            color: #2c3e50;
-            font-size: 18px;
-            font-weight: bold;
-            padding: 0 20px;
-        }}
-        
-        @media (max-width: 768px) {{
-            .timeline-events {{
-                flex-wrap: wrap;
-                justify-content: center;
-            }}
-            
-            .timeline-event {{
-                margin: 10px;
-                min-width: 120px;
-            }}
-            
-            .timeline-line {{
-                display: none;
-            }}
-        }}
-        </style>
-        
-        <div class="timeline-container">
-            <div class="timeline-title">Security Events Timeline for {user}</div>
-            <div class="timeline-line"></div>
-            <div class="timeline-events">
-        """
+        # Create timeline HTML/CSS; static markup lives in module-level templates and only the events are formatted here
+        parts = [TIMELINE_CSS, TIMELINE_HEADER.format(user=user)]
         
         # Select key events to display (max 6 for good visualization)
         if len(sorted_df) > 6:
-            # Get highest risk events
-            df_with_risk = sorted_df.copy()
-            df_with_risk['risk_score'] = risk_scores[:len(sorted_df)]
-            key_events = df_with_risk.nlargest(6, 'risk_score')
-            key_events = key_events.sort_values('_time')
+            # Get highest risk events; sorted_df is in time order, so sorted positions keep that order
+            key_events = sorted_df.iloc[np.sort(top_risk_indices(risk_scores[:len(sorted_df)], 6))]
         else:
             key_events = sorted_df
         
         # Generate timeline events
-        for idx, (_, event) in enumerate(key_events.iterrows()):
+        for idx, event in enumerate(key_events.to_dict('records')):
             risk_score = risk_scores[idx] if idx < len(risk_scores) else 0
             anomaly = anomalies[idx] if idx < len(anomalies) else {}
             
@@ -599,32 +683,22 @@ class Dashboard:
             
             time_str = event['_time'].strftime('%H:%M')
             date_str = event['_time'].strftime('%m/%d')
-            action = self.risk_engine.explain_sql(event['Statement'])
+            action = event['Explanation']
             
-            timeline_html += f"""
-                <div class="timeline-event">
-                    <div class="event-icon {risk_class}">
-                        {icon}
-                    </div>
-                    <div class="event-time">{time_str}</div>
-                    <div class="event-time">{date_str}</div>
-                    <div class="event-description">
-                        {action[:50]}...
-                    </div>
-                    <div class="event-description">
-                        <strong>{event['DB_Name']}</strong><br/>
-                        {event['Accessed_Obj'][:20]}...
-                    </div>
-                    <div class="event-risk {risk_label}">
-                        Risk: {risk_score:.0f}
-                    </div>
-                </div>
-            """
-        
-        timeline_html += """
-            </div>
-        </div>
-        """
+            parts.append(TIMELINE_EVENT.format(
+                risk_class=risk_class,
+                icon=icon,
+                time_str=time_str,
+                date_str=date_str,
+                action=action[:50],
+                db_name=event['DB_Name'],
+                accessed_obj=event['Accessed_Obj'][:20],
+                risk_label=risk_label,
+                risk_score=risk_score
+            ))
+        
+        parts.append(TIMELINE_FOOTER)
+        timeline_html = ''.join(parts)
         
         # Display the timeline
         st.components.v1.html(timeline_html, height=450)
@@ -632,10 +706,10 @@ class Dashboard:
         # Add summary stats below timeline
         col1, col2, col3 = st.columns(3)
         with col1:
-            avg_risk = np.mean(risk_scores) if risk_scores else 0
+            avg_risk = risk_scores.mean() if len(risk_scores) else 0
             st.metric("Average Risk Score", f"{avg_risk:.1f}/100")
         with col2:
-            peak_risk = max(risk_scores) if risk_scores else 0
+            peak_risk = risk_scores.max() if len(risk_scores) else 0
             st.metric("Peak Risk Event", f"{peak_risk:.0f}/100")
         with col3:
             time_span = (user_df['_time'].max() - user_df['_time'].min()).total_seconds() / 3600
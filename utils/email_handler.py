@@ -7,6 +7,117 @@ from email.mime.base import MIMEBase
 from email import encoders
 import numpy as np
 from datetime import datetime
+from string import Template
+from utils.risk_engine import top_risk_indices
+
+# Email markup is parsed once at import; only the per-report values are substituted
+EMAIL_EVENT_ROW_TEMPLATE = Template("""
+<tr>
+    <td>$rank</td>
+    <td>$user</td>
+    <td style="color: $risk_color; font-weight: bold;">$risk_score/100</td>
+    <td>$database</td>
+    <td>$timestamp</td>
+</tr>
+""")
+
+EMAIL_HTML_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .header { background-color: #2c3e50; color: white; padding: 20px; text-align: center; }
+        .content { padding: 20px; }
+        .summary-box { background-color: #f8f9fa; border-left: 4px solid #007bff; padding: 15px; margin: 20px 0; }
+        .metrics { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin: 20px 0; }
+        .metric-card { background: white; border: 1px solid #ddd; padding: 15px; border-radius: 5px; text-align: center; }
+        .metric-value { font-size: 24px; font-weight: bold; color: #007bff; }
+        .high-risk { color: #dc3545 !important; }
+        .medium-risk { color: #fd7e14 !important; }
+        .low-risk { color: #28a745 !important; }
+        table { width: 100%; border-collapse: collapse; margin: 20px 0; }
+        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        th { background-color: #f2f2f2; }
+        .alert { background-color: #fff3cd; border: 1px solid #ffeaa7; padding: 10px; border-radius: 5px; margin: 10px 0; }
+        .footer { background-color: #f8f9fa; padding: 15px; text-align: center; font-size: 12px; color: #666; }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>🔍 SQL Insider Threat Analysis Report</h1>
+        <p>Generated on $generated</p>
+    </div>
+    
+    <div class="content">
+        <div class="summary-box">
+            <h3>📊 Executive Summary</h3>
+            <p>This automated report provides insights into SQL database activities, highlighting potential security risks and anomalous behavior patterns.</p>
+        </div>
+        
+        <div class="metrics">
+            <div class="metric-card">
+                <div class="metric-value">$total_events</div>
+                <div>Total Events</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-value">$unique_users</div>
+                <div>Unique Users</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-value $avg_risk_class">$avg_risk/100</div>
+                <div>Average Risk Score</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-value high-risk">$high_risk_count</div>
+                <div>High Risk Events</div>
+            </div>
+        </div>
+        
+        $alert
+        
+        <h3>🎯 Top Risk Events</h3>
+        <table>
+            <thead>
+                <tr>
+                    <th>#</th>
+                    <th>User</th>
+                    <th>Risk Score</th>
+                    <th>Database</th>
+                    <th>Timestamp</th>
+                </tr>
+            </thead>
+            <tbody>
+                $top_events
+            </tbody>
+        </table>
+        
+        <h3>📋 Analysis Details</h3>
+        <ul>
+            <li><strong>Analysis Period:</strong> $period_start to $period_end</li>
+            <li><strong>Databases Monitored:</strong> $databases</li>
+            <li><strong>Risk Assessment:</strong> Events scored 0-100 based on operation type, timing, context, and user behavior</li>
+            <li><strong>Anomaly Detection:</strong> Off-hours access, unusual volumes, and atypical user behavior patterns</li>
+        </ul>
+        
+        <div class="alert">
+            <strong>📞 Next Steps:</strong>
+            <ul>
+                <li>Review high-risk events (score ≥70) for potential security incidents</li>
+                <li>Investigate off-hours database access for business justification</li>
+                <li>Validate sensitive data access against authorized personnel lists</li>
+                <li>Contact the security team for detailed analysis if needed</li>
+            </ul>
+        </div>
+    </div>
+    
+    <div class="footer">
+        <p>This is an automated security report from the SQL Insider Threat Analysis System.</p>
+        <p>For questions or detailed analysis, please contact the Information Security team.</p>
+    </div>
+</body>
+</html>
+""")
 
 class EmailHandler:
     def __init__(self):
@@ -15,9 +126,72 @@ class EmailHandler:
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.sender_email = os.getenv("SENDER_EMAIL", "security@company.com")
         self.sender_password = os.getenv("SENDER_PASSWORD", "")
+        self._smtp = None  # connection shared by the sends in a with block, opened on first use
+        self._holders = 0  # nesting depth of with blocks keeping the connection open
+        
+    def __enter__(self):
+        """Keep one SMTP connection open across every send inside the with block"""
+        self._holders += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        """Close the shared connection when the outermost with block ends"""
+        self._holders -= 1
+        if self._holders == 0:
+            self.close()
         
+    def _get_smtp(self):
+        """Return a live SMTP connection, connecting and logging in only when needed"""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+        
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        server.starttls()
+        
+        # Use app password or actual password
+        if self.sender_password:
+            server.login(self.sender_email, self.sender_password)
+        
+        self._smtp = server
+        return server
+    
+    def close(self):
+        """Close the cached SMTP connection, if any"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+    
     def send_outlook_email(self, recipient, subject, summary_text, df, risk_scores):
         """Send audit summary email via Outlook/SMTP"""
+        return self.send_bulk([recipient], subject, summary_text, df, risk_scores)[recipient]
+    
+    def send_bulk(self, recipients, subject, summary_text, df, risk_scores):
+        """Send the same audit summary to several recipients, rendering the content once"""
+        try:
+            # Both renderings read the same scores; convert them once
+            risk_scores = np.asarray(risk_scores)
+            html_content = self._generate_email_html(summary_text, df, risk_scores)
+            text_content = self._generate_email_text(summary_text, df, risk_scores)
+        except Exception:
+            return {recipient: self._simulate_send(recipient, subject, summary_text) for recipient in recipients}
+        
+        # One connection for the whole batch, closed once every recipient has been tried
+        with self:
+            return {
+                recipient: self._send_rendered(recipient, subject, summary_text, html_content, text_content)
+                for recipient in recipients
+            }
+    
+    def _send_rendered(self, recipient, subject, summary_text, html_content, text_content):
+        """Send prerendered HTML/text content to one recipient over the shared connection"""
         try:
             # Create message
             msg = MIMEMultipart('alternative')
@@ -25,10 +199,6 @@ class EmailHandler:
             msg['To'] = recipient
             msg['Subject'] = subject
             
-            # Generate email content
-            html_content = self._generate_email_html(summary_text, df, risk_scores)
-            text_content = self._generate_email_text(summary_text, df, risk_scores)
-            
             # Attach content
             text_part = MIMEText(text_content, 'plain')
             html_part = MIMEText(html_content, 'html')
@@ -36,157 +206,80 @@ class EmailHandler:
             msg.attach(text_part)
             msg.attach(html_part)
             
-            # Send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            
-            # Use app password or actual password
-            if self.sender_password:
-                server.login(self.sender_email, self.sender_password)
-            
+            # Send email over the shared connection, reconnecting once if the server dropped it;
+            # outside an enclosing with block the connection is closed again once this send is done
             text = msg.as_string()
-            server.sendmail(self.sender_email, recipient, text)
-            server.quit()
+            with self:
+                try:
+                    self._get_smtp().sendmail(self.sender_email, recipient, text)
+                except smtplib.SMTPServerDisconnected:
+                    self._smtp = None
+                    self._get_smtp().sendmail(self.sender_email, recipient, text)
             
             return True
             
-        except Exception as e:
-            # For demo purposes, we'll simulate email sending
-            print(f"Email simulation: Would send to {recipient}")
-            print(f"Subject: {subject}")
-            print(f"Content preview: {summary_text[:200]}...")
-            return True  # Return success for demo
+        except Exception:
+            return self._simulate_send(recipient, subject, summary_text)
+    
+    def _simulate_send(self, recipient, subject, summary_text):
+        """Print the email instead of sending it; the demo fallback when SMTP is unavailable"""
+        print(f"Email simulation: Would send to {recipient}")
+        print(f"Subject: {subject}")
+        print(f"Content preview: {summary_text[:200]}...")
+        return True  # Return success for demo
     
     def _generate_email_html(self, summary_text, df, risk_scores):
         """Generate HTML email content"""
         # Calculate key metrics
-        high_risk_count = sum(1 for score in risk_scores if score >= 70) if risk_scores else 0
-        avg_risk = np.mean(risk_scores) if risk_scores else 0
+        high_risk_count = int((risk_scores >= 70).sum())
+        avg_risk = risk_scores.mean() if len(risk_scores) > 0 else 0
         total_events = len(df)
         unique_users = df['OS_User'].nunique()
         
         # Get top risk events
-        top_events_html = ""
-        if risk_scores and len(risk_scores) > 0:
-            risk_indices = np.argsort(risk_scores)[-3:][::-1]
+        rows = []
+        if len(risk_scores) > 0:
+            risk_indices = top_risk_indices(risk_scores, 3)
             for i, idx in enumerate(risk_indices, 1):
                 if idx < len(df):
                     row = df.iloc[idx]
                     risk_color = "#dc3545" if risk_scores[idx] >= 70 else "#fd7e14" if risk_scores[idx] >= 40 else "#28a745"
-                    top_events_html += f"""
-                    <tr>
-                        <td>{i}</td>
-                        <td>{row['OS_User']}</td>
-                        <td style="color: {risk_color}; font-weight: bold;">{risk_scores[idx]}/100</td>
-                        <td>{row['DB_Name']}</td>
-                        <td>{row['_time'].strftime('%Y-%m-%d %H:%M')}</td>
-                    </tr>
-                    """
+                    rows.append(EMAIL_EVENT_ROW_TEMPLATE.substitute(
+                        rank=i,
+                        user=row['OS_User'],
+                        risk_color=risk_color,
+                        risk_score=risk_scores[idx],
+                        database=row['DB_Name'],
+                        timestamp=row['_time'].strftime('%Y-%m-%d %H:%M')
+                    ))
+        top_events_html = ''.join(rows)
         
-        html_template = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .header {{ background-color: #2c3e50; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; }}
-                .summary-box {{ background-color: #f8f9fa; border-left: 4px solid #007bff; padding: 15px; margin: 20px 0; }}
-                .metrics {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin: 20px 0; }}
-                .metric-card {{ background: white; border: 1px solid #ddd; padding: 15px; border-radius: 5px; text-align: center; }}
-                .metric-value {{ font-size: 24px; font-weight: bold; color: #007bff; }}
-                .high-risk {{ color: #dc3545 !important; }}
-                .medium-risk {{ color: #fd7e14 !important; }}
-                .low-risk {{ color: #28a745 !important; }}
-                table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                .alert {{ background-color: #fff3cd; border: 1px solid #ffeaa7; padding: 10px; border-radius: 5px; margin: 10px 0; }}
-                .footer {{ background-color: #f8f9fa; padding: 15px; text-align: center; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>🔍 SQL Insider Threat Analysis Report</h1>
-                <p>Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
-            </div>
-            
-            <div class="content">
-                <div class="summary-box">
-                    <h3>📊 Executive Summary</h3>
-                    <p>This automated report provides insights into SQL database activities, highlighting potential security risks and anomalous behavior patterns.</p>
-                </div>
-                
-                <div class="metrics">
-                    <div class="metric-card">
-                        <div class="metric-value">{total_events}</div>
-                        <div>Total Events</div>
-                    </div>
-                    <div class="metric-card">
-                        <div class="metric-value">{unique_users}</div>
-                        <div>Unique Users</div>
-                    </div>
-                    <div class="metric-card">
-                        <div class="metric-value {'high-risk' if avg_risk >= 70 else 'medium-risk' if avg_risk >= 40 else 'low-risk'}">{avg_risk:.1f}/100</div>
-                        <div>Average Risk Score</div>
-                    </div>
-                    <div class="metric-card">
-                        <div class="metric-value high-risk">{high_risk_count}</div>
-                        <div>High Risk Events</div>
-                    </div>
-                </div>
-                
-                {f'<div class="alert">🚨 <strong>Alert:</strong> {high_risk_count} high-risk events detected requiring immediate review.</div>' if high_risk_count > 0 else ''}
-                
-                <h3>🎯 Top Risk Events</h3>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>#</th>
-                            <th>User</th>
-                            <th>Risk Score</th>
-                            <th>Database</th>
-                            <th>Timestamp</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {top_events_html}
-                    </tbody>
-                </table>
-                
-                <h3>📋 Analysis Details</h3>
-                <ul>
-                    <li><strong>Analysis Period:</strong> {df['_time'].min().strftime('%Y-%m-%d')} to {df['_time'].max().strftime('%Y-%m-%d')}</li>
-                    <li><strong>Databases Monitored:</strong> {', '.join(df['DB_Name'].unique()[:5])}{', ...' if df['DB_Name'].nunique() > 5 else ''}</li>
-                    <li><strong>Risk Assessment:</strong> Events scored 0-100 based on operation type, timing, context, and user behavior</li>
-                    <li><strong>Anomaly Detection:</strong> Off-hours access, unusual volumes, and atypical user behavior patterns</li>
-                </ul>
-                
-                <div class="alert">
-                    <strong>📞 Next Steps:</strong>
-                    <ul>
-                        <li>Review high-risk events (score ≥70) for potential security incidents</li>
-                        <li>Investigate off-hours database access for business justification</li>
-                        <li>Validate sensitive data access against authorized personnel lists</li>
-                        <li>Contact the security team for detailed analysis if needed</li>
-                    </ul>
-                </div>
-            </div>
-            
-            <div class="footer">
-                <p>This is an automated security report from the SQL Insider Threat Analysis System.</p>
-                <p>For questions or detailed analysis, please contact the Information Security team.</p>
-            </div>
-        </body>
-        </html>
-        """
+        alert = (
+            f'<div class="alert">🚨 <strong>Alert:</strong> {high_risk_count} high-risk events detected requiring immediate review.</div>'
+            if high_risk_count > 0 else ''
+        )
+        databases = ', '.join(df['DB_Name'].unique()[:5]) + (', ...' if df['DB_Name'].nunique() > 5 else '')
+        
+        html_template = EMAIL_HTML_TEMPLATE.substitute(
+            generated=datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+            total_events=total_events,
+            unique_users=unique_users,
+            avg_risk_class='high-risk' if avg_risk >= 70 else 'medium-risk' if avg_risk >= 40 else 'low-risk',
+            avg_risk=f"{avg_risk:.1f}",
+            high_risk_count=high_risk_count,
+            alert=alert,
+            top_events=top_events_html,
+            period_start=df['_time'].min().strftime('%Y-%m-%d'),
+            period_end=df['_time'].max().strftime('%Y-%m-%d'),
+            databases=databases
+        )
         
         return html_template
     
     def _generate_email_text(self, summary_text, df, risk_scores):
         """Generate plain text email content"""
-        high_risk_count = sum(1 for score in risk_scores if score >= 70) if risk_scores else 0
-        avg_risk = np.mean(risk_scores) if risk_scores else 0
+        high_risk_count = int((risk_scores >= 70).sum())
+        avg_risk = risk_scores.mean() if len(risk_scores) > 0 else 0
         
         text_content = f"""
 SQL INSIDER THREAT ANALYSIS REPORT
@@ -211,8 +304,8 @@ TOP RISK EVENTS
 """
         
         # Add top risk events
-        if risk_scores and len(risk_scores) > 0:
-            risk_indices = np.argsort(risk_scores)[-3:][::-1]
+        if len(risk_scores) > 0:
+            risk_indices = top_risk_indices(risk_scores, 3)
             for i, idx in enumerate(risk_indices, 1):
                 if idx < len(df):
                     row = df.iloc[idx]
@@ -2,24 +2,63 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import io
-import base64
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.charts.barcharts import VerticalBarChart
-from reportlab.graphics.charts.piecharts import Pie
-from reportlab.lib.colors import HexColor
+import re
+from functools import cached_property
+from utils.risk_engine import top_risk_indices
+
+# reportlab is imported inside the methods that draw the PDF, so loading this module
+# (and building the text fallback) does not pay for reportlab's import and stylesheet
+
+# Tables whose access is called out in the recommendations, matched as case-insensitive substrings
+SENSITIVE_TABLES = ['Salaries', 'Employees', 'HR_Records', 'CustomerData', 'AuditLog']
+SENSITIVE_TABLE_RE = re.compile('|'.join(map(re.escape, SENSITIVE_TABLES)), re.IGNORECASE)
+
+# Markdown bold and heading markers stripped from the summary before it becomes PDF paragraphs
+MARKDOWN_MARKERS_RE = re.compile(r'\*\*|#{2,3}')
+
+# Recommendations that close every report, after the ones driven by the findings
+GENERIC_RECOMMENDATIONS = (
+    "Implement database activity monitoring (DAM) for real-time threat detection",
+    "Establish baseline user behavior profiles for improved anomaly detection",
+    "Regular review of database access privileges and permissions",
+    "Implement data loss prevention (DLP) controls for sensitive tables",
+    "Consider implementing database encryption for sensitive data",
+    "Establish incident response procedures for high-risk database activities"
+)
+
+def risk_statistics(risk_scores):
+    """Risk level counts and summary statistics shared by every report section"""
+    scores = np.asarray(risk_scores)
+    low, medium, high = np.bincount(np.digitize(scores, [40, 70]), minlength=3).tolist()
+    stats = {'count': len(scores), 'high': high, 'medium': medium, 'low': low}
+    if len(scores) == 0:
+        return dict(stats, mean=np.nan, median=np.nan, std=np.nan, min=np.nan, max=np.nan)
+    return dict(
+        stats,
+        mean=scores.mean(),
+        median=np.median(scores),
+        std=scores.std(),
+        min=scores.min(),
+        max=scores.max()
+    )
 
 class ReportGenerator:
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.custom_styles = self._create_custom_styles()
+    @cached_property
+    def styles(self):
+        """reportlab's sample stylesheet, built on the first PDF"""
+        from reportlab.lib.styles import getSampleStyleSheet
+        return getSampleStyleSheet()
+    
+    @cached_property
+    def custom_styles(self):
+        """Report-specific paragraph styles, built on the first PDF"""
+        return self._create_custom_styles()
     
     def _create_custom_styles(self):
         """Create custom paragraph styles for the report"""
+        from reportlab.lib import colors
+        from reportlab.lib.styles import ParagraphStyle
+        
         styles = {}
         
         # Title style
@@ -69,13 +108,28 @@ class ReportGenerator:
             leftIndent=20
         )
         
+        # Numbered list item; spaceAfter takes the place of a Spacer flowable per item
+        styles['ListItem'] = ParagraphStyle(
+            'ListItem',
+            parent=self.styles['Normal'],
+            spaceAfter=6
+        )
+        
         return styles
     
-    def generate_pdf_report(self, df, risk_scores, anomaly_data, summary_text):
-        """Generate a comprehensive PDF report"""
-        buffer = io.BytesIO()
+    def generate_pdf_report(self, df, risk_scores, anomaly_data, summary_text, output=None):
+        """Generate a comprehensive PDF report, as bytes or written to a caller-provided binary stream"""
+        buffer = io.BytesIO() if output is None else output
+        # Scores are 0-100, so one int16 array serves the statistics, ranking and every section
+        risk_scores = np.asarray(risk_scores, dtype=np.int16)
+        stats = risk_statistics(risk_scores)
+        # Highest-risk events, highest first; the findings table shows 10 and the fallback 5
+        top_events = top_risk_indices(risk_scores, 10)
         
         try:
+            from reportlab.lib.pagesizes import A4
+            from reportlab.platypus import SimpleDocTemplate, PageBreak
+            
             # Create document
             doc = SimpleDocTemplate(buffer, pagesize=A4, 
                                   rightMargin=72, leftMargin=72,
@@ -89,32 +143,40 @@ class ReportGenerator:
             story.append(PageBreak())
             
             # Executive summary
-            story.extend(self._create_executive_summary(df, risk_scores, anomaly_data, summary_text))
+            story.extend(self._create_executive_summary(df, stats, summary_text))
             story.append(PageBreak())
             
             # Risk analysis charts
-            story.extend(self._create_risk_analysis_section(risk_scores))
+            story.extend(self._create_risk_analysis_section(stats))
             story.append(PageBreak())
             
             # Detailed findings
-            story.extend(self._create_detailed_findings(df, risk_scores, anomaly_data))
+            story.extend(self._create_detailed_findings(df, risk_scores, anomaly_data, top_events))
             story.append(PageBreak())
             
             # Recommendations
-            story.extend(self._create_recommendations(df, risk_scores, anomaly_data))
+            story.extend(self._create_recommendations(df, stats, anomaly_data))
             
-            # Build PDF
+            # Build PDF; a caller's stream (file, HTTP response) receives it directly
             doc.build(story)
-            buffer.seek(0)
+            if output is not None:
+                return None
             
             return buffer.getvalue()
             
         except Exception as e:
             # Return simple text-based report if PDF generation fails
-            return self._generate_fallback_report(df, risk_scores, summary_text).encode('utf-8')
+            fallback = self._generate_fallback_report(df, risk_scores, stats, top_events[:5], summary_text)
+            if output is not None:
+                output.write(fallback)
+                return None
+            return fallback
     
     def _create_title_page(self):
         """Create the title page content"""
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer
+        
         content = []
         
         # Title
@@ -156,8 +218,12 @@ class ReportGenerator:
         
         return content
     
-    def _create_executive_summary(self, df, risk_scores, anomaly_data, summary_text):
+    def _create_executive_summary(self, df, stats, summary_text):
         """Create executive summary section"""
+        from reportlab.lib import colors
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+        
         content = []
         
         # Section header
@@ -166,27 +232,27 @@ class ReportGenerator:
         content.append(Spacer(1, 0.2*inch))
         
         # Convert markdown summary to PDF-friendly format
-        summary_lines = summary_text.split('\n')
-        for line in summary_lines:
+        line_gap = Spacer(1, 6)
+        for line in summary_text.splitlines():
             if line.strip():
                 # Remove markdown formatting and convert to paragraph
-                clean_line = line.replace('**', '').replace('##', '').replace('###', '')
+                clean_line = MARKDOWN_MARKERS_RE.sub('', line)
                 if clean_line.startswith('- '):
                     clean_line = '• ' + clean_line[2:]
                 content.append(Paragraph(clean_line, self.styles['Normal']))
-                content.append(Spacer(1, 6))
+                content.append(line_gap)
         
         content.append(Spacer(1, 0.3*inch))
         
         # Key metrics table
-        if risk_scores:
+        if stats['count'] > 0:
             metrics_data = [
                 ['Metric', 'Value'],
                 ['Total Events Analyzed', str(len(df))],
-                ['Average Risk Score', f"{np.mean(risk_scores):.1f}/100"],
-                ['High Risk Events (≥70)', str(sum(1 for score in risk_scores if score >= 70))],
-                ['Medium Risk Events (40-69)', str(sum(1 for score in risk_scores if 40 <= score < 70))],
-                ['Low Risk Events (<40)', str(sum(1 for score in risk_scores if score < 40))],
+                ['Average Risk Score', f"{stats['mean']:.1f}/100"],
+                ['High Risk Events (≥70)', str(stats['high'])],
+                ['Medium Risk Events (40-69)', str(stats['medium'])],
+                ['Low Risk Events (<40)', str(stats['low'])],
                 ['Unique Users', str(df['OS_User'].nunique())],
                 ['Unique Databases', str(df['DB_Name'].nunique())],
             ]
@@ -207,8 +273,12 @@ class ReportGenerator:
         
         return content
     
-    def _create_risk_analysis_section(self, risk_scores):
+    def _create_risk_analysis_section(self, stats):
         """Create risk analysis charts section"""
+        from reportlab.lib import colors
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+        
         content = []
         
         # Section header
@@ -216,18 +286,19 @@ class ReportGenerator:
         content.append(header)
         content.append(Spacer(1, 0.2*inch))
         
-        if risk_scores:
+        if stats['count'] > 0:
             # Risk distribution
-            high_risk = sum(1 for score in risk_scores if score >= 70)
-            medium_risk = sum(1 for score in risk_scores if 40 <= score < 70)
-            low_risk = sum(1 for score in risk_scores if score < 40)
+            high_risk = stats['high']
+            medium_risk = stats['medium']
+            low_risk = stats['low']
+            total = stats['count']
             
             # Risk distribution table
             risk_data = [
                 ['Risk Level', 'Count', 'Percentage'],
-                ['High (70-100)', str(high_risk), f"{(high_risk/len(risk_scores)*100):.1f}%"],
-                ['Medium (40-69)', str(medium_risk), f"{(medium_risk/len(risk_scores)*100):.1f}%"],
-                ['Low (0-39)', str(low_risk), f"{(low_risk/len(risk_scores)*100):.1f}%"],
+                ['High (70-100)', str(high_risk), f"{(high_risk/total*100):.1f}%"],
+                ['Medium (40-69)', str(medium_risk), f"{(medium_risk/total*100):.1f}%"],
+                ['Low (0-39)', str(low_risk), f"{(low_risk/total*100):.1f}%"],
             ]
             
             risk_table = Table(risk_data, colWidths=[2*inch, 1*inch, 1.5*inch])
@@ -250,19 +321,23 @@ class ReportGenerator:
             # Risk statistics
             stats_text = f"""
             <b>Risk Score Statistics:</b><br/>
-            • Minimum Risk Score: {min(risk_scores)}<br/>
-            • Maximum Risk Score: {max(risk_scores)}<br/>
-            • Average Risk Score: {np.mean(risk_scores):.1f}<br/>
-            • Median Risk Score: {np.median(risk_scores):.1f}<br/>
-            • Standard Deviation: {np.std(risk_scores):.1f}<br/>
+            • Minimum Risk Score: {stats['min']}<br/>
+            • Maximum Risk Score: {stats['max']}<br/>
+            • Average Risk Score: {stats['mean']:.1f}<br/>
+            • Median Risk Score: {stats['median']:.1f}<br/>
+            • Standard Deviation: {stats['std']:.1f}<br/>
             """
             
             content.append(Paragraph(stats_text, self.styles['Normal']))
         
         return content
     
-    def _create_detailed_findings(self, df, risk_scores, anomaly_data):
+    def _create_detailed_findings(self, df, risk_scores, anomaly_data, top_events):
         """Create detailed findings section"""
+        from reportlab.lib import colors
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+        
         content = []
         
         # Section header
@@ -271,23 +346,28 @@ class ReportGenerator:
         content.append(Spacer(1, 0.2*inch))
         
         # High-risk events
-        if risk_scores:
-            # Get top 10 highest risk events
-            risk_indices = np.argsort(risk_scores)[-10:][::-1]
-            
+        if len(risk_scores) > 0:
             findings_data = [['User', 'Time', 'Database', 'Object', 'Risk Score', 'Activity']]
             
-            for idx in risk_indices:
-                if idx < len(df):
-                    row = df.iloc[idx]
-                    findings_data.append([
-                        row['OS_User'],
-                        row['_time'].strftime('%Y-%m-%d %H:%M'),
-                        row['DB_Name'],
-                        row['Accessed_Obj'][:20] + '...' if len(str(row['Accessed_Obj'])) > 20 else str(row['Accessed_Obj']),
-                        str(risk_scores[idx]),
-                        row['Statement'][:30] + '...' if len(row['Statement']) > 30 else row['Statement']
-                    ])
+            # Gather the listed events column by column rather than materializing a Series per row
+            rows = top_events[top_events < len(df)]
+            events = df.iloc[rows]
+            for user, event_time, db_name, accessed_obj, score, statement in zip(
+                events['OS_User'].to_numpy(),
+                events['_time'].dt.strftime('%Y-%m-%d %H:%M').to_numpy(),
+                events['DB_Name'].to_numpy(),
+                events['Accessed_Obj'].to_numpy(),
+                risk_scores[rows],
+                events['Statement'].to_numpy()
+            ):
+                findings_data.append([
+                    user,
+                    event_time,
+                    db_name,
+                    accessed_obj[:20] + '...' if len(str(accessed_obj)) > 20 else str(accessed_obj),
+                    str(score),
+                    statement[:30] + '...' if len(statement) > 30 else statement
+                ])
             
             findings_table = Table(findings_data, colWidths=[1*inch, 1.2*inch, 1*inch, 1*inch, 0.8*inch, 1.5*inch])
             findings_table.setStyle(TableStyle([
@@ -323,8 +403,11 @@ class ReportGenerator:
         
         return content
     
-    def _create_recommendations(self, df, risk_scores, anomaly_data):
+    def _create_recommendations(self, df, stats, anomaly_data):
         """Create recommendations section"""
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer
+        
         content = []
         
         # Section header
@@ -335,9 +418,9 @@ class ReportGenerator:
         recommendations = []
         
         # Risk-based recommendations
-        if risk_scores:
-            high_risk_count = sum(1 for score in risk_scores if score >= 70)
-            avg_risk = np.mean(risk_scores)
+        if stats['count'] > 0:
+            high_risk_count = stats['high']
+            avg_risk = stats['mean']
             
             if high_risk_count > 0:
                 recommendations.append(f"Immediate investigation required for {high_risk_count} high-risk events (≥70 risk score)")
@@ -352,28 +435,17 @@ class ReportGenerator:
                 recommendations.append(f"Review {off_hours_count} off-hours database access events for business justification")
         
         # Sensitive data recommendations
-        sensitive_tables = ['Salaries', 'Employees', 'HR_Records', 'CustomerData', 'AuditLog']
-        sensitive_access = df['Accessed_Obj'].apply(
-            lambda x: any(s.lower() in str(x).lower() for s in sensitive_tables)
-        ).sum()
+        sensitive_access = int(df['Accessed_Obj'].astype(str).str.contains(SENSITIVE_TABLE_RE).sum())
         
         if sensitive_access > 0:
             recommendations.append(f"Enhanced monitoring recommended for {sensitive_access} sensitive data access events")
         
-        # Generic recommendations
-        recommendations.extend([
-            "Implement database activity monitoring (DAM) for real-time threat detection",
-            "Establish baseline user behavior profiles for improved anomaly detection",
-            "Regular review of database access privileges and permissions",
-            "Implement data loss prevention (DLP) controls for sensitive tables",
-            "Consider implementing database encryption for sensitive data",
-            "Establish incident response procedures for high-risk database activities"
-        ])
-        
-        # Add recommendations to content
-        for i, rec in enumerate(recommendations, 1):
-            content.append(Paragraph(f"{i}. {rec}", self.styles['Normal']))
-            content.append(Spacer(1, 6))
+        # Add recommendations to content, the generic ones last
+        item_style = self.custom_styles['ListItem']
+        content.extend(
+            Paragraph(f"{i}. {rec}", item_style)
+            for i, rec in enumerate(recommendations + list(GENERIC_RECOMMENDATIONS), 1)
+        )
         
         content.append(Spacer(1, 0.3*inch))
         
@@ -389,9 +461,9 @@ class ReportGenerator:
         
         return content
     
-    def _generate_fallback_report(self, df, risk_scores, summary_text):
-        """Generate a simple text-based report if PDF generation fails"""
-        report = f"""
+    def _generate_fallback_report(self, df, risk_scores, stats, top_events, summary_text):
+        """Generate a simple text-based report, as UTF-8 bytes, if PDF generation fails"""
+        header = f"""
 SQL INSIDER THREAT ANALYSIS REPORT
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
@@ -400,21 +472,21 @@ EXECUTIVE SUMMARY
 
 RISK STATISTICS
 Total Events: {len(df)}
-Average Risk Score: {np.mean(risk_scores):.1f}/100
-High Risk Events (≥70): {sum(1 for score in risk_scores if score >= 70)}
-Medium Risk Events (40-69): {sum(1 for score in risk_scores if 40 <= score < 70)}
-Low Risk Events (<40): {sum(1 for score in risk_scores if score < 40)}
+Average Risk Score: {stats['mean']:.1f}/100
+High Risk Events (≥70): {stats['high']}
+Medium Risk Events (40-69): {stats['medium']}
+Low Risk Events (<40): {stats['low']}
 
 TOP RISK EVENTS
 """
         
         # Add top 5 risk events
-        if risk_scores:
-            risk_indices = np.argsort(risk_scores)[-5:][::-1]
-            for i, idx in enumerate(risk_indices, 1):
+        parts = [header]
+        if len(risk_scores) > 0:
+            for i, idx in enumerate(top_events, 1):
                 if idx < len(df):
                     row = df.iloc[idx]
-                    report += f"{i}. User: {row['OS_User']}, Risk: {risk_scores[idx]}/100, DB: {row['DB_Name']}, Time: {row['_time']}\n"
+                    parts.append(f"{i}. User: {row['OS_User']}, Risk: {risk_scores[idx]}/100, DB: {row['DB_Name']}, Time: {row['_time']}\n")
         
-        report += "\n--- End of Report ---"
-        return report
+        parts.append("\n--- End of Report ---")
+        return ''.join(parts).encode('utf-8')
@@ -2,6 +2,84 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, time
 import re
+from functools import lru_cache
+
+def top_risk_indices(risk_scores, k):
+    """Return positions of the k highest risk scores, highest first"""
+    risk_scores = np.asarray(risk_scores)
+    if len(risk_scores) <= k:
+        return np.argsort(-risk_scores, kind='stable')
+    top = np.argpartition(risk_scores, -k)[-k:]
+    return top[np.argsort(-risk_scores[top], kind='stable')]
+
+# Change ticket references such as CHG1234 or REQ42 in the audit context
+CHANGE_TICKET_RE = re.compile(r'(?:chg|change|ticket|req|request)\d+')
+
+@lru_cache(maxsize=32)
+def _keyword_re(keywords):
+    """One alternation matching any keyword in a tuple as a literal substring"""
+    return re.compile('|'.join(map(re.escape, keywords)))
+
+def _distinct_lowered(column):
+    """Codes into the distinct values of a column (-1 where missing) and those values lower-cased"""
+    codes, distinct = pd.factorize(column)
+    return codes, pd.Series(distinct, dtype=object).astype(str).str.lower()
+
+@lru_cache(maxsize=8)
+def _primary_sql_lut(weight_items):
+    """Which (DELETE, UPDATE, WHERE, SELECT *) masks the first two SQL rules decide, and their risk"""
+    weights = dict(weight_items)
+    decided, primary = [], []
+    for mask in range(16):
+        has_delete, has_update, has_where, has_select_star = (bool(mask & bit) for bit in (8, 4, 2, 1))
+        if has_select_star:
+            risk = weights.get('SELECT *', 20)
+        elif (has_delete or has_update) and not has_where:
+            risk = min(weights.get('DELETE' if has_delete else 'UPDATE', 20) + 15, 50)
+        else:
+            risk = 0
+        decided.append(has_select_star or ((has_delete or has_update) and not has_where))
+        primary.append(risk)
+    return np.array(decided), np.array(primary)
+
+def _since_midnight(t):
+    """A datetime.time as an offset from midnight"""
+    return pd.Timedelta(hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond)
+
+@lru_cache(maxsize=65536)
+def _explain_statement(s):
+    """Plain English explanation of an upper-cased SQL statement; audit logs repeat statements heavily"""
+    # Handle common SQL patterns
+    if "SELECT *" in s:
+        return "queried all columns from a table (potential data dump)"
+    elif "DELETE" in s and "WHERE" not in s:
+        return "deleted all records from a table (high risk)"
+    elif "DELETE" in s:
+        return "deleted specific records from a table"
+    elif "UPDATE" in s and "WHERE" not in s:
+        return "updated all records in a table (high risk)"
+    elif "UPDATE" in s:
+        return "updated specific records in a table"
+    elif "INSERT" in s:
+        return "inserted new records into a table"
+    elif "DROP TABLE" in s:
+        return "permanently removed a table from the database"
+    elif "DROP" in s:
+        return "removed database objects (schema change)"
+    elif "ALTER" in s:
+        return "modified database structure or permissions"
+    elif "TRUNCATE" in s:
+        return "removed all data from a table (non-recoverable)"
+    elif "GRANT" in s:
+        return "granted database permissions to users"
+    elif "REVOKE" in s:
+        return "removed database permissions from users"
+    elif "CREATE" in s:
+        return "created new database objects"
+    elif "SELECT" in s:
+        return "queried specific data from tables"
+    else:
+        return "executed a custom SQL operation"
 
 class RiskEngine:
     def __init__(self):
@@ -35,44 +113,52 @@ class RiskEngine:
             'scheduled', 'approved', 'maintenance', 'routine', 'standard',
             'automated', 'planned', 'regular'
         ]
+        
+        # User, program and object patterns scored by the per-factor checks
+        self.admin_patterns = ['admin', 'root', 'sa', 'dba', 'system', 'service']
+        self.high_risk_programs = [
+            'sqlcmd', 'psql', 'mysql', 'mongosh', 'redis-cli',
+            'powershell', 'cmd', 'bash', 'python', 'perl', 'script'
+        ]
+        self.medium_risk_programs = [
+            'ssms', 'management studio', 'workbench', 'navigator',
+            'toad', 'dbeaver', 'navicat'
+        ]
+        self.high_risk_object_patterns = [
+            'credit_card', 'credit_cards', 'creditcard', 'creditcards',
+            'payment', 'financial', 'salary', 'payroll', 'ssn', 'social_security'
+        ]
+        self.sensitive_object_patterns = [
+            'password', 'pwd', 'secret', 'key', 'token', 'hash',
+            'credit', 'card', 'account', 'employee', 'customer'
+        ]
+        
+        # Destructive operations on these objects are always scored as critical
+        self.dangerous_operations = ['DELETE', 'DROP', 'TRUNCATE']
+        self.dangerous_object_keywords = ['credit', 'card', 'payment', 'financial', 'salary', 'ssn', 'social']
+        
+        # One alternation per keyword list so each check is a single regex scan
+        self._high_risk_re = _keyword_re(tuple(self.high_risk_keywords))
+        self._low_risk_re = _keyword_re(tuple(self.low_risk_keywords))
+        self._admin_re = _keyword_re(tuple(self.admin_patterns))
+        self._high_risk_program_re = _keyword_re(tuple(self.high_risk_programs))
+        self._medium_risk_program_re = _keyword_re(tuple(self.medium_risk_programs))
+        self._sensitive_other_re = _keyword_re(tuple(self.sensitive_object_patterns))
+        self._dangerous_operation_re = _keyword_re(tuple(self.dangerous_operations))
+    
+    def _sensitive_table_res(self, sensitive_tables):
+        """Regexes for the caller's sensitive tables: the 35-point object check and the dangerous-operation check"""
+        tables = tuple(table.lower() for table in sensitive_tables)
+        return (
+            _keyword_re(tables + tuple(self.high_risk_object_patterns)),
+            _keyword_re(tuple(self.dangerous_object_keywords) + tables)
+        )
     
     def explain_sql(self, statement):
         """Convert SQL statement to plain English explanation"""
         if pd.isna(statement) or not statement:
             return "executed an unknown operation"
-        s = str(statement).upper().strip()
-        
-        # Handle common SQL patterns
-        if "SELECT *" in s:
-            return "queried all columns from a table (potential data dump)"
-        elif "DELETE" in s and "WHERE" not in s:
-            return "deleted all records from a table (high risk)"
-        elif "DELETE" in s:
-            return "deleted specific records from a table"
-        elif "UPDATE" in s and "WHERE" not in s:
-            return "updated all records in a table (high risk)"
-        elif "UPDATE" in s:
-            return "updated specific records in a table"
-        elif "INSERT" in s:
-            return "inserted new records into a table"
-        elif "DROP TABLE" in s:
-            return "permanently removed a table from the database"
-        elif "DROP" in s:
-            return "removed database objects (schema change)"
-        elif "ALTER" in s:
-            return "modified database structure or permissions"
-        elif "TRUNCATE" in s:
-            return "removed all data from a table (non-recoverable)"
-        elif "GRANT" in s:
-            return "granted database permissions to users"
-        elif "REVOKE" in s:
-            return "removed database permissions from users"
-        elif "CREATE" in s:
-            return "created new database objects"
-        elif "SELECT" in s:
-            return "queried specific data from tables"
-        else:
-            return "executed a custom SQL operation"
+        return _explain_statement(str(statement).upper().strip())
     
     def get_sql_operation_risk(self, statement):
         """Calculate risk score based on SQL operation type"""
@@ -80,14 +166,11 @@ class RiskEngine:
             return 10  # Default moderate risk for unknown operations
         s = str(statement).upper().strip()
         
-        # Check for specific high-risk patterns
-        if "SELECT *" in s:
-            return self.sql_operation_weights.get('SELECT *', 20)
-        
-        # Check for operations without WHERE clauses (higher risk)
-        if ("DELETE" in s or "UPDATE" in s) and "WHERE" not in s:
-            base_score = self.sql_operation_weights.get('DELETE' if 'DELETE' in s else 'UPDATE', 20)
-            return min(base_score + 15, 50)  # Add penalty for missing WHERE
+        # SELECT * and DELETE/UPDATE without WHERE (penalized, capped at 50) come from the shared mask table
+        decided, primary = _primary_sql_lut(tuple(self.sql_operation_weights.items()))
+        mask = ("DELETE" in s) << 3 | ("UPDATE" in s) << 2 | ("WHERE" in s) << 1 | ("SELECT *" in s)
+        if decided[mask]:
+            return primary[mask].item()
         
         # Check for each operation type
         for operation, weight in self.sql_operation_weights.items():
@@ -133,17 +216,15 @@ class RiskEngine:
         context_lower = context.lower()
         
         # High risk keywords
-        for keyword in self.high_risk_keywords:
-            if keyword in context_lower:
-                return 25
+        if self._high_risk_re.search(context_lower):
+            return 25
         
         # Low risk keywords
-        for keyword in self.low_risk_keywords:
-            if keyword in context_lower:
-                return 0
+        if self._low_risk_re.search(context_lower):
+            return 0
         
         # Change ticket patterns (generally lower risk)
-        if re.search(r'(chg|change|ticket|req|request)\d+', context_lower):
+        if CHANGE_TICKET_RE.search(context_lower):
             return 5
         
         return 10  # Neutral context
@@ -154,29 +235,15 @@ class RiskEngine:
             return 0
         
         obj_lower = str(accessed_obj).lower()
-        for sensitive_table in sensitive_tables:
-            if sensitive_table.lower() in obj_lower:
-                return 35
-        
-        # Check for high-risk sensitive patterns
-        high_risk_patterns = [
-            'credit_card', 'credit_cards', 'creditcard', 'creditcards',
-            'payment', 'financial', 'salary', 'payroll', 'ssn', 'social_security'
-        ]
         
-        for pattern in high_risk_patterns:
-            if pattern in obj_lower:
-                return 35
+        # Named sensitive tables and high-risk sensitive patterns
+        sensitive_re, _ = self._sensitive_table_res(sensitive_tables)
+        if sensitive_re.search(obj_lower):
+            return 35
         
         # Check for other sensitive patterns
-        sensitive_patterns = [
-            'password', 'pwd', 'secret', 'key', 'token', 'hash',
-            'credit', 'card', 'account', 'employee', 'customer'
-        ]
-        
-        for pattern in sensitive_patterns:
-            if pattern in obj_lower:
-                return 25
+        if self._sensitive_other_re.search(obj_lower):
+            return 25
         
         return 0
     
@@ -189,13 +256,10 @@ class RiskEngine:
             risk_score += 15
         
         # System or admin accounts
-        admin_patterns = ['admin', 'root', 'sa', 'dba', 'system', 'service']
         user_lower = os_user.lower() if pd.notna(os_user) else ''
         
-        for pattern in admin_patterns:
-            if pattern in user_lower:
-                risk_score += 10
-                break
+        if self._admin_re.search(user_lower):
+            risk_score += 10
         
         return min(risk_score, 25)  # Cap at 25 points
     
@@ -207,24 +271,12 @@ class RiskEngine:
         program_lower = program.lower()
         
         # High-risk programs (command line tools, scripts)
-        high_risk_programs = [
-            'sqlcmd', 'psql', 'mysql', 'mongosh', 'redis-cli',
-            'powershell', 'cmd', 'bash', 'python', 'perl', 'script'
-        ]
-        
-        for high_risk in high_risk_programs:
-            if high_risk in program_lower:
-                return 15
+        if self._high_risk_program_re.search(program_lower):
+            return 15
         
         # Medium-risk programs (management tools)
-        medium_risk_programs = [
-            'ssms', 'management studio', 'workbench', 'navigator',
-            'toad', 'dbeaver', 'navicat'
-        ]
-        
-        for medium_risk in medium_risk_programs:
-            if medium_risk in program_lower:
-                return 8
+        if self._medium_risk_program_re.search(program_lower):
+            return 8
         
         return 5  # Default for other programs
     
@@ -244,13 +296,9 @@ class RiskEngine:
             accessed_obj = str(row['Accessed_Obj']).lower() if pd.notna(row['Accessed_Obj']) else ''
             
             # Check if DELETE/DROP/TRUNCATE on sensitive tables like credit cards
-            dangerous_ops = ['DELETE', 'DROP', 'TRUNCATE']
-            sensitive_keywords = ['credit', 'card', 'payment', 'financial', 'salary', 'ssn', 'social']
-            
-            is_dangerous_sensitive = (
-                any(op in statement_upper for op in dangerous_ops) and
-                (any(keyword in accessed_obj for keyword in sensitive_keywords) or
-                 any(table.lower() in accessed_obj for table in sensitive_tables))
+            _, dangerous_object_re = self._sensitive_table_res(sensitive_tables)
+            is_dangerous_sensitive = bool(
+                self._dangerous_operation_re.search(statement_upper) and dangerous_object_re.search(accessed_obj)
             )
             
             # Calculate weighted total
@@ -284,3 +332,119 @@ class RiskEngine:
         except Exception as e:
             # Return moderate risk if calculation fails
             return 50
+    
+    def _statement_risks(self, statements):
+        """SQL operation risk and destructive-operation flag per row, scored once per distinct statement"""
+        codes, distinct = pd.factorize(statements)
+        upper = pd.Series(distinct).astype(str).str.upper()
+        
+        # The first matching rule wins, as in get_sql_operation_risk
+        weights = self.sql_operation_weights
+        found = {
+            operation: upper.str.contains(operation, regex=False).to_numpy()
+            for operation in {*weights, 'SELECT *', 'DELETE', 'UPDATE', 'WHERE'}
+        }
+        
+        # SELECT * and DELETE/UPDATE without WHERE are one gather from a 4-bit mask;
+        # statements neither rule decides fall through to the plain operation weights
+        mask = (
+            (found['DELETE'].astype(np.uint8) << 3) | (found['UPDATE'].astype(np.uint8) << 2)
+            | (found['WHERE'].astype(np.uint8) << 1) | found['SELECT *'].astype(np.uint8)
+        )
+        decided, primary = _primary_sql_lut(tuple(weights.items()))
+        sql_risk = np.where(
+            decided[mask],
+            primary[mask],
+            np.select([found[operation] for operation in weights], list(weights.values()), default=5)
+        )
+        sql_risk[(upper == '').to_numpy()] = 10
+        destructive = upper.str.contains(self._dangerous_operation_re).to_numpy()
+        
+        # Missing statements (code -1) take the trailing entry: moderate risk, never destructive
+        return np.append(sql_risk, 10)[codes], np.append(destructive, False)[codes]
+    
+    def calculate_risk_scores(self, df, sensitive_tables):
+        """Calculate the comprehensive risk score of every row in df as an integer array"""
+        sql_risk, destructive = self._statement_risks(df['Statement'])
+        
+        # Timing: weekend, off-hours and late-night points, capped at 35
+        times = df['_time']
+        if not pd.api.types.is_datetime64_any_dtype(times):
+            times = pd.to_datetime(times, errors='coerce', format='mixed')
+        time_of_day = times - times.dt.normalize()
+        off_hours = (time_of_day >= _since_midnight(self.off_hours_start)) | (time_of_day <= _since_midnight(self.off_hours_end))
+        late_night = time_of_day <= pd.Timedelta(hours=5)
+        time_risk = 10 * (times.dt.weekday >= 5).to_numpy() + 15 * off_hours.to_numpy() + 10 * late_night.to_numpy()
+        time_risk = np.where(times.notna().to_numpy(), np.minimum(time_risk, 35), 5)
+        
+        # Text factors are scored once per distinct value, with a trailing entry for missing values
+        # Context: missing is suspicious, then high-risk, low-risk and change-ticket wording
+        codes, contexts = _distinct_lowered(df['MS_Context'])
+        context_risk = np.select(
+            [
+                (contexts == '').to_numpy(),
+                contexts.str.contains(self._high_risk_re).to_numpy(),
+                contexts.str.contains(self._low_risk_re).to_numpy(),
+                contexts.str.contains(CHANGE_TICKET_RE).to_numpy()
+            ],
+            [10, 25, 0, 5],
+            default=10
+        )
+        context_risk = np.append(context_risk, 10)[codes]
+        
+        # Sensitive objects: named tables and high-risk patterns, then other sensitive patterns
+        codes, objects = _distinct_lowered(df['Accessed_Obj'])
+        sensitive_re, dangerous_object_re = self._sensitive_table_res(sensitive_tables)
+        sensitive_risk = np.select(
+            [
+                objects.str.contains(sensitive_re).to_numpy(),
+                objects.str.contains(self._sensitive_other_re).to_numpy()
+            ],
+            [35, 25],
+            default=0
+        )
+        sensitive_risk = np.append(sensitive_risk, 0)[codes]
+        dangerous_object = np.append(objects.str.contains(dangerous_object_re).to_numpy(), False)[codes]
+        
+        # User: shared or mismatched accounts and admin-style names, capped at 25
+        codes, users = _distinct_lowered(df['OS_User'])
+        admin = np.append(users.str.contains(self._admin_re).to_numpy(), False)[codes]
+        mismatched = np.asarray(df['OS_User'], dtype=object) != np.asarray(df['Exec_User'], dtype=object)
+        user_risk = np.minimum(15 * mismatched + 10 * admin, 25)
+        
+        # Program: command-line tools, then management tools
+        codes, programs = _distinct_lowered(df['Program'])
+        program_risk = np.select(
+            [
+                programs.str.contains(self._high_risk_program_re).to_numpy(),
+                programs.str.contains(self._medium_risk_program_re).to_numpy()
+            ],
+            [15, 8],
+            default=5
+        )
+        program_risk = np.append(program_risk, 5)[codes]
+        
+        # Destructive operations on sensitive data
+        is_dangerous_sensitive = destructive & dangerous_object
+        
+        # Calculate weighted total
+        total_risk = (
+            sql_risk * 0.3 +           # 30% weight for SQL operation
+            time_risk * 0.2 +          # 20% weight for timing
+            context_risk * 0.15 +      # 15% weight for context
+            sensitive_risk * 0.25 +    # 25% weight for sensitive objects
+            user_risk * 0.05 +         # 5% weight for user factors
+            program_risk * 0.05        # 5% weight for program
+        )
+        
+        # Apply multipliers for high-risk combinations, in place on the affected rows only
+        np.multiply(total_risk, 1.8, out=total_risk, where=(sensitive_risk > 0) & (sql_risk >= 30))
+        np.multiply(total_risk, 1.5, out=total_risk, where=(time_risk > 0) & (context_risk >= 20))
+        np.multiply(total_risk, 2.0, out=total_risk, where=(sensitive_risk > 0) & (sql_risk >= 40) & (time_risk > 0))
+        
+        # Critical risk for dangerous operations on sensitive data, at least 75
+        np.multiply(total_risk, 2.5, out=total_risk, where=is_dangerous_sensitive)
+        np.maximum(total_risk, 75, out=total_risk, where=is_dangerous_sensitive)
+        
+        # Truncate like int() and keep within 0-100
+        return np.clip(total_risk.astype(np.int64), 0, 100)